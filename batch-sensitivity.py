@@ -0,0 +1,81 @@
+import argparse
+import glob
+import os
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from batching import threshold_sensitivity
+from sweep_cache import parse_run_name
+from trace_loader import load_drop_trace
+from trace_pool import parallel_map
+
+# Sensitivity of the batch statistics to the batch threshold.
+# For every drop trace of a sweep and every candidate threshold, computes the
+# number of batches, mean batch size and mean inter-batch gap in one pass over
+# the sorted inter-drop gaps, and writes a threshold x run table.
+
+METRICS = ['n_batches', 'mean_batch_size', 'mean_inter_gap']
+
+def parse_thresholds(text):
+    # "0.1,0.34,1" or "start:stop:step" (stop included)
+    if ':' in text:
+        start, stop, step = (float(v) for v in text.split(':'))
+        return np.round(np.arange(start, stop + step / 2, step), 9)
+    return np.array(sorted(float(v) for v in text.split(',')))
+
+def run_sensitivity(file_path, thresholds, min_time, skip_first_gap):
+    run = parse_run_name(file_path) or {}
+    try:
+        df = load_drop_trace(file_path)
+    except Exception as e:
+        print(f"Error reading {file_path}: {e}")
+        return None
+
+    times = df['timestamp'].to_numpy()
+    times = times[times >= min_time]
+    result = threshold_sensitivity(times, thresholds, skip_first_gap)
+
+    rows = pd.DataFrame(result)
+    rows.insert(0, 'run', os.path.basename(file_path).replace('-drp.tr', ''))
+    for i, name in enumerate(['qdisc', 'bandwidth', 'delay', 'buffer'], start=1):
+        rows.insert(i, name, run.get(name))
+    rows['n_drops'] = times.size
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description='Batch statistics of every run for a range of batch thresholds')
+    parser.add_argument('pattern', nargs='?', default='FQCD-bw*Mb-dlay*-drp.tr', help='glob of the drop traces')
+    parser.add_argument('--thresholds', default='0.05:2.0:0.05', help='"start:stop:step" or comma separated list (s)')
+    parser.add_argument('--min-time', type=float, default=20, help='ignore drops before this time (s)')
+    parser.add_argument('--skip-first-gap', action='store_true', help='leave the first inter-batch gap out of the average')
+    parser.add_argument('--output', default='batch-sensitivity.csv', help='CSV with one row per (run, threshold)')
+    parser.add_argument('--metric', default='mean_inter_gap', choices=METRICS,
+                        help='metric of the threshold x run table written next to --output')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='worker processes (default: all cores)')
+    args = parser.parse_args()
+
+    thresholds = parse_thresholds(args.thresholds)
+    file_list = sorted(glob.glob(args.pattern))
+    if not file_list:
+        print("No drop traces found.")
+        return
+
+    sensitivity = partial(run_sensitivity, thresholds=thresholds, min_time=args.min_time,
+                          skip_first_gap=args.skip_first_gap)
+    tables = [t for t in parallel_map(sensitivity, file_list, jobs=args.jobs) if t is not None]
+    if not tables:
+        print("No data to process.")
+        return
+    table = pd.concat(tables, ignore_index=True)
+    table.to_csv(args.output, index=False)
+
+    # Thresholds as rows, runs as columns
+    wide = table.pivot(index='threshold', columns='run', values=args.metric)
+    wide_output = os.path.splitext(args.output)[0] + f'-{args.metric}.csv'
+    wide.to_csv(wide_output)
+    print(f"{len(tables)} runs x {len(thresholds)} thresholds written to {args.output} and {wide_output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,277 @@
+import numpy as np
+from collections import Counter, namedtuple
+
+# Vectorised grouping of drop events into batches.
+# A new batch starts whenever the gap to the previous drop is larger than the
+# threshold, so batch ids are simply the cumulative sum of (diff > threshold).
+# Everything is computed with O(n) NumPy operations on the sorted drop times.
+#
+# The threshold can also be 'auto': estimate_threshold then picks it per trace
+# from the distribution of the inter-drop gaps.
+
+AUTO_THRESHOLD = 'auto'
+
+DropBatches = namedtuple('DropBatches', [
+    'batch_id',     # batch id of every drop
+    'start_index',  # index of the first drop of every batch
+    'start_times',  # time of the first drop of every batch
+    'end_times',    # time of the last drop of every batch
+    'sizes',        # number of drops in every batch
+    'intra_gaps',   # gaps between consecutive drops of the same batch
+    'inter_gaps',   # gaps between the starts of consecutive batches
+    'threshold',    # gap threshold used (the estimated one for 'auto')
+])
+
+
+def estimate_threshold(times, bins=128):
+    # Drop gaps are bimodal on a log scale: short gaps inside a batch (one
+    # congestion event) and long ones between batches. Otsu's method on the
+    # histogram of log10(gap) finds the cut that maximises the between-class
+    # variance, i.e. the split of a 2 component mixture, which sits in the valley
+    # between the two modes. When a range of cuts is equally good (an empty
+    # valley) the middle of that range is used.
+    # Returns None when there are not enough distinct gaps to split.
+    gaps = np.diff(np.asarray(times, dtype=np.float64))
+    gaps = gaps[gaps > 0]
+    if gaps.size < 2:
+        return None
+    log_gaps = np.log10(gaps)
+    low, high = log_gaps.min(), log_gaps.max()
+    if high - low < 1e-9:
+        return None
+
+    counts, edges = np.histogram(log_gaps, bins=bins, range=(low, high))
+    centers = (edges[:-1] + edges[1:]) / 2
+
+    # Class sizes and means for a cut after every bin but the last
+    below = np.cumsum(counts)[:-1]
+    above = gaps.size - below
+    below_sum = np.cumsum(counts * centers)[:-1]
+    total_sum = np.sum(counts * centers)
+    valid = (below > 0) & (above > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_below = below_sum / below
+        mean_above = (total_sum - below_sum) / above
+    between = np.where(valid, below * above * (mean_below - mean_above) ** 2, -1.0)
+
+    best = np.flatnonzero(between >= between.max() * (1 - 1e-9))
+    cut = best[len(best) // 2]
+    return float(10 ** edges[cut + 1])
+
+
+def resolve_threshold(times, threshold):
+    # A number is used as is; 'auto' is estimated from the trace, falling back
+    # to a single batch (infinite threshold) when it cannot be estimated
+    if threshold != AUTO_THRESHOLD:
+        return float(threshold)
+    estimated = estimate_threshold(times)
+    return np.inf if estimated is None else estimated
+
+
+def segment_batches(times, threshold):
+    # times must be sorted (load_drop_trace already sorts by timestamp)
+    # threshold is a gap in seconds or 'auto'
+    times = np.asarray(times, dtype=np.float64)
+    threshold = resolve_threshold(times, threshold)
+    if times.size == 0:
+        empty = np.array([], dtype=np.float64)
+        no_index = np.array([], dtype=np.int64)
+        return DropBatches(no_index, no_index, empty, empty, no_index, empty, empty, threshold)
+
+    gaps = np.diff(times)
+    new_batch = gaps > threshold
+
+    batch_id = np.concatenate(([0], np.cumsum(new_batch)))
+    start_index = np.flatnonzero(np.concatenate(([True], new_batch)))
+    end_index = np.append(start_index[1:], times.size) - 1
+    start_times = times[start_index]
+
+    return DropBatches(
+        batch_id=batch_id,
+        start_index=start_index,
+        start_times=start_times,
+        end_times=times[end_index],
+        sizes=end_index - start_index + 1,
+        intra_gaps=gaps[~new_batch],
+        inter_gaps=np.diff(start_times),
+        threshold=threshold,
+    )
+
+
+def modal_batch_size(sizes):
+    # Most common batch size; ties go to the size seen first, like Counter.most_common
+    sizes = np.asarray(sizes)
+    if sizes.size == 0:
+        return None
+    counts = np.bincount(sizes)
+    is_modal = counts[sizes] == counts.max()
+    return int(sizes[np.argmax(is_modal)])
+
+
+def batch_time_matrix(times, batches, mask):
+    # Drop times of the selected batches as a (n_batches, size) matrix.
+    # All selected batches must have the same size (e.g. sizes == modal size).
+    times = np.asarray(times, dtype=np.float64)
+    starts = batches.start_index[mask]
+    sizes = batches.sizes[mask]
+    if starts.size == 0:
+        return np.empty((0, 0), dtype=np.float64)
+    if np.any(sizes != sizes[0]):
+        raise ValueError("batch_time_matrix needs batches of a single size")
+    return times[starts[:, None] + np.arange(sizes[0])]
+
+
+def threshold_sensitivity(times, thresholds, skip_first_gap=False):
+    # Batch count, mean batch size and mean inter-batch gap for every threshold
+    # in one pass, without re-segmenting the trace per threshold.
+    # With the inter-drop gaps sorted, the number of batch boundaries for a
+    # threshold is a searchsorted away, and the last (first) boundary index is a
+    # running max (min) over the gaps taken from the largest down. The mean gap
+    # between batch starts is then (last start - first start) / boundaries.
+    times = np.asarray(times, dtype=np.float64)
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    n_thresholds = thresholds.size
+    result = {
+        'threshold': thresholds,
+        'n_batches': np.zeros(n_thresholds, dtype=np.int64),
+        'mean_batch_size': np.full(n_thresholds, np.nan),
+        'mean_inter_gap': np.full(n_thresholds, np.nan),
+    }
+    if times.size == 0:
+        return result
+
+    gaps = np.diff(times)
+    order = np.argsort(-gaps, kind='stable')  # largest gap first
+    last_boundary = np.maximum.accumulate(order)
+    first_boundary = np.minimum.accumulate(order)
+
+    boundaries = gaps.size - np.searchsorted(np.sort(gaps), thresholds, side='right')
+    n_batches = boundaries + 1
+    result['n_batches'] = n_batches
+    result['mean_batch_size'] = times.size / n_batches
+
+    # A boundary after gap i means a batch starts at times[i + 1]
+    has_gaps = boundaries > (1 if skip_first_gap else 0)
+    k = boundaries[has_gaps]
+    last_start = times[last_boundary[k - 1] + 1]
+    if skip_first_gap:
+        first_start = times[first_boundary[k - 1] + 1]
+        result['mean_inter_gap'][has_gaps] = (last_start - first_start) / (k - 1)
+    else:
+        result['mean_inter_gap'][has_gaps] = (last_start - times[0]) / k
+    return result
+
+
+class OnlineBatchStats:
+    # Batch statistics of a drop trace fed in chunks of sorted drop times, with
+    # memory bounded by the largest batch instead of the trace length.
+    # Only the drops of the batch that is still open are kept between updates;
+    # completed batches go into running sums:
+    #   - mean / variance of the gaps between consecutive batch starts (Welford,
+    #     chunks merged with Chan's formula),
+    #   - histogram of batch sizes,
+    #   - per batch size, the sum of the within-batch gaps at every position, so
+    #     the modal size gives process_data.py's avg_within_batch_diffs.
+    # A numeric threshold is required; 'auto' needs the whole gap distribution.
+
+    def __init__(self, threshold, min_time=0.0):
+        if threshold == AUTO_THRESHOLD:
+            raise ValueError("OnlineBatchStats needs a numeric threshold")
+        self.threshold = float(threshold)
+        self.min_time = min_time
+        self.n_drops = 0
+        self.n_batches = 0                  # completed batches
+        self.size_counts = Counter()        # batch size -> completed batches
+        self.within_sums = {}               # batch size -> sum of gaps per position
+        self.gap_count = 0
+        self.gap_mean = 0.0
+        self.gap_m2 = 0.0
+        self.last_start = None              # start of the last completed batch
+        self.open_batch = np.array([], dtype=np.float64)
+
+    def update(self, times):
+        # Returns the start times of the batches completed by this chunk
+        no_batches = np.array([], dtype=np.float64)
+        times = np.asarray(times, dtype=np.float64)
+        times = times[times >= self.min_time]
+        if times.size == 0:
+            return no_batches
+        self.n_drops += times.size
+
+        times = np.concatenate((self.open_batch, times))
+        batches = segment_batches(times, self.threshold)
+        # The last batch may continue in the next chunk
+        complete = len(batches.sizes) - 1
+        self.open_batch = times[batches.start_index[-1]:]
+        if complete == 0:
+            return no_batches
+
+        sizes = batches.sizes[:complete]
+        self.n_batches += complete
+        self.size_counts.update(sizes.tolist())
+        for size in np.unique(sizes):
+            if size < 2:
+                continue
+            mask = np.zeros(len(batches.sizes), dtype=bool)
+            mask[:complete] = batches.sizes[:complete] == size
+            gap_sums = np.diff(batch_time_matrix(times, batches, mask), axis=1).sum(axis=0)
+            self.within_sums[int(size)] = self.within_sums.get(int(size), 0.0) + gap_sums
+
+        # Gaps between the starts of completed batches, including the one from
+        # the previous chunk's last completed batch
+        starts = batches.start_times[:complete]
+        if self.last_start is not None:
+            starts = np.concatenate(([self.last_start], starts))
+        self._add_gaps(np.diff(starts))
+        self.last_start = batches.start_times[complete - 1]
+        return batches.start_times[:complete]
+
+    def _add_gaps(self, gaps):
+        if gaps.size == 0:
+            return
+        count = gaps.size
+        mean = gaps.mean()
+        m2 = np.sum((gaps - mean) ** 2)
+        total = self.gap_count + count
+        delta = mean - self.gap_mean
+        self.gap_mean += delta * count / total
+        self.gap_m2 += m2 + delta ** 2 * self.gap_count * count / total
+        self.gap_count = total
+
+    def finish(self):
+        # Close the open batch at the end of the trace
+        if self.open_batch.size:
+            size = self.open_batch.size
+            if self.last_start is not None:
+                self._add_gaps(self.open_batch[:1] - self.last_start)
+            self.last_start = self.open_batch[0]
+            self.n_batches += 1
+            self.size_counts[size] += 1
+            if size > 1:
+                self.within_sums[size] = self.within_sums.get(size, 0.0) + np.diff(self.open_batch)
+            self.open_batch = np.array([], dtype=np.float64)
+        return self
+
+    # Running statistics of the gaps between the starts of completed batches
+    # (all batches after finish)
+    def inter_gap_mean(self):
+        return self.gap_mean if self.gap_count else np.nan
+
+    def inter_gap_var(self):
+        # Sample variance, like np.var(..., ddof=1)
+        return self.gap_m2 / (self.gap_count - 1) if self.gap_count > 1 else np.nan
+
+    def size_histogram(self):
+        return dict(sorted(self.size_counts.items()))
+
+    def modal_batch_size(self):
+        if not self.size_counts:
+            return None
+        return self.size_counts.most_common(1)[0][0]
+
+    def avg_within_batch_diffs(self, size=None):
+        # Mean gap at every position of batches of the given size (modal by default)
+        size = self.modal_batch_size() if size is None else size
+        if size is None or size < 2 or size not in self.within_sums:
+            return []
+        return (self.within_sums[size] / self.size_counts[size]).tolist()
@@ -1,55 +1,29 @@
-from scapy.all import rdpcap, TCP, IP
 import matplotlib.pyplot as plt
+import numpy as np
+
+from decimate import Decimator
+from pcap_reader import demux_flows, ip_to_int, read_pcap
+from signals import common_start
+from trace_loader import load_drop_trace
 
 def parse_persistent_pcap(file_path, sender_ip, receiver_ip, dest_port):
-    sent_times = []
-    sent_seqs = []
-
-    packets = rdpcap(file_path)
-
-    for pkt in packets:
-        try:
-            if IP in pkt and TCP in pkt:
-                ip_pkt = pkt[IP]
-                tcp_pkt = ip_pkt[TCP]
-
-                src_ip = ip_pkt.src
-                dst_ip = ip_pkt.dst
-                src_port = tcp_pkt.sport
-                dst_port_pkt = tcp_pkt.dport
-
-                # Check if packet is s->r and matches dest_port
-                if src_ip == sender_ip and dst_ip == receiver_ip and dst_port_pkt == dest_port:
-                    # Extract SEQ
-                    sent_times.append(pkt.time)
-                    sent_seqs.append(tcp_pkt.seq)
-        except Exception as e:
-            print("Error in parse persistent pcap:", e)
-            continue
-            
-    return sent_times, sent_seqs
+    sender = ip_to_int(sender_ip)
+    receiver = ip_to_int(receiver_ip)
+
+    # Packets s->r that match dest_port
+    def persistent_flow(c):
+        return (c['src'] == sender) & (c['dst'] == receiver) & (c['dport'] == dest_port)
+
+    packets = read_pcap(file_path, keep=persistent_flow)
+    return packets['time'], packets['seq'].astype(np.int64)
 
 def parse_bursty_pcap(file_path):
     # Returns a dictionary mapping from dest_port to list of packet times
     flow_packet_times = {}
 
-    packets = rdpcap(file_path)
-
-    for pkt in packets:
-        try:
-            if IP in pkt and TCP in pkt:
-                ip_pkt = pkt[IP]
-                tcp_pkt = ip_pkt[TCP]
-
-                dst_port_pkt = tcp_pkt.dport
-
-                # Collect packet times based on destination port
-                if dst_port_pkt not in flow_packet_times:
-                    flow_packet_times[dst_port_pkt] = []
-                flow_packet_times[dst_port_pkt].append(pkt.time)
-        except Exception as e:
-            print("Error in parse bursty pcap:", e)
-            continue
+    # Collect packet times based on destination port
+    for (src, dst, sport, dst_port_pkt), flow in demux_flows(file_path).items():
+        flow_packet_times.setdefault(dst_port_pkt, []).extend(flow['time'].tolist())
 
     return flow_packet_times
 
@@ -122,27 +96,15 @@ def build_active_flows_time_series(events):
     return times, active_counts
 
 def parse_drop_log(drop_log_file, persistent_flow_port):
-    drop_times = []
-    drop_seqs = []
-    with open(drop_log_file, 'r') as f:
-        next(f)  # Skip header line, if any
-        for line in f:
-            parts = line.strip().split('\t')
-            if len(parts) < 3:
-                continue
-            timestamp_sec = float(parts[0])
-            seq_num = int(parts[1])
-            dest_port = int(parts[2])
-            if dest_port == persistent_flow_port:
-                drop_times.append(timestamp_sec)
-                drop_seqs.append(seq_num)
-    return drop_times, drop_seqs
+    drops = load_drop_trace(drop_log_file)
+    drops = drops[drops['dest_port'] == persistent_flow_port]
+    return drops['timestamp'].to_numpy(), drops['seq'].to_numpy()
 
 def plot_persistent_flow_with_bursty(sent_times, sent_seqs, drop_times, drop_seqs, bursty_times, active_counts, plot_title):
     fig, ax1 = plt.subplots(figsize=(12, 6))
 
-    # Plot sent sequences
-    ax1.scatter(sent_times, sent_seqs, s=0.5, color='blue', label='Persistent Flow Sent Sequences')
+    # Plot sent sequences, decimated to the pixels they cover (redone on zoom)
+    Decimator(ax1).scatter(sent_times, sent_seqs, s=0.5, color='blue', label='Persistent Flow Sent Sequences')
 
     # Plot drops
     ax1.scatter(drop_times, drop_seqs, s=50, color='red', label='Drops', marker='x')
@@ -154,7 +116,7 @@ def plot_persistent_flow_with_bursty(sent_times, sent_seqs, drop_times, drop_seq
 
     # Plot number of active bursty flows
     ax2 = ax1.twinx()
-    ax2.step(bursty_times, active_counts, where='post', color='green', label='Active Bursty Flows', alpha=0.5)
+    Decimator(ax2).plot(bursty_times, active_counts, drawstyle='steps-post', color='green', label='Active Bursty Flows', alpha=0.5)
 
     ax2.set_ylabel('Number of Active Bursty Flows', color='green')
     ax2.tick_params(axis='y', labelcolor='green')
@@ -189,27 +151,21 @@ def main():
     drop_times, drop_seqs = parse_drop_log(drop_log_file, persistent_flow_port)
 
     # Adjust times to align
-    all_times = sent_times + drop_times + bursty_times
+    bursty_times = np.asarray(bursty_times, dtype=np.float64)
+    start_time = common_start(sent_times, drop_times, bursty_times)
 
-    if not all_times:
+    if start_time is None:
         print("No data found.")
         return
-    start_time = min(all_times)
 
-    sent_times = [t - start_time for t in sent_times]
-    drop_times = [t - start_time for t in drop_times]
-    bursty_times = [t - start_time for t in bursty_times]
+    sent_times = sent_times - start_time
+    drop_times = drop_times - start_time
+    bursty_times = bursty_times - start_time
 
-    if sent_seqs:
+    if len(sent_seqs):
         start_seq = sent_seqs[0]
-        sent_seqs = [s - start_seq for s in sent_seqs]
-    else:
-        sent_seqs = []
-
-    if drop_seqs:
-        drop_seqs = [s - start_seq for s in drop_seqs]
-    else:
-        drop_seqs = []
+        sent_seqs = sent_seqs - start_seq
+        drop_seqs = drop_seqs - start_seq
 
     # Plot
     plot_title = "Persistent Flow with Active Bursty Flows"
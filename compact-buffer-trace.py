@@ -0,0 +1,55 @@
+import argparse
+import glob
+import os
+from functools import partial
+
+from trace_loader import load_buffer_trace, save_buffer_steps
+from trace_pool import parallel_map
+
+# Convert queue length traces (-buf.tr, text or binary) to the compact step
+# form of trace_loader.save_buffer_steps (-buf.npz). load_buffer_trace reads
+# either form, so the plotters can be pointed at the .npz files directly.
+#   python compact-buffer-trace.py 'FQCD-bw*Mb-dlay*-buf.tr' -j 8
+
+def output_path(file_path):
+    if file_path.endswith('.tr'):
+        return file_path[:-len('.tr')] + '.npz'
+    return file_path + '.npz'
+
+def convert(file_path, force=False):
+    # (file_path, records in, steps out, bytes in, bytes out), steps out is
+    # None when the output was already newer than the trace
+    out_path = output_path(file_path)
+    size = os.path.getsize(file_path)
+    if not force and os.path.exists(out_path) and os.path.getmtime(out_path) >= os.path.getmtime(file_path):
+        return file_path, None, None, size, os.path.getsize(out_path)
+    times, qlens = load_buffer_trace(file_path)
+    n_steps = save_buffer_steps(out_path, times, qlens)
+    return file_path, len(times), n_steps, size, os.path.getsize(out_path)
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert buffer traces to compact step traces')
+    parser.add_argument('patterns', nargs='+', help='globs of the -buf.tr traces')
+    parser.add_argument('-j', '--jobs', type=int, help='worker processes (default: one per CPU)')
+    parser.add_argument('--force', action='store_true', help='convert traces whose .npz is up to date')
+    args = parser.parse_args()
+
+    files = sorted({path for pattern in args.patterns for path in glob.glob(pattern)
+                    if not path.endswith('.npz')})
+    if not files:
+        print("No buffer traces found.")
+        return
+
+    total_in = total_out = 0
+    for file_path, n_records, n_steps, size_in, size_out in parallel_map(partial(convert, force=args.force), files, jobs=args.jobs):
+        total_in += size_in
+        total_out += size_out
+        if n_steps is None:
+            print(f"{file_path}: up to date")
+        else:
+            print(f"{file_path}: {n_records} records -> {n_steps} steps, "
+                  f"{size_in} -> {size_out} bytes ({size_in / max(size_out, 1):.1f}x)")
+    print(f"Total: {total_in} -> {total_out} bytes ({total_in / max(total_out, 1):.1f}x)")
+
+if __name__ == '__main__':
+    main()
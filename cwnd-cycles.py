@@ -0,0 +1,102 @@
+import argparse
+import glob
+import os
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from cwnd_cycles import cross_check, extract_cycles
+from sweep_cache import TRACE_NAME, parse_run_name
+from trace_loader import companion_trace, load_cwnd_trace, load_drop_trace
+from trace_pool import parallel_map
+
+# Congestion window sawtooth of every run, checked against its drop batches:
+#   python cwnd-cycles.py 'FQCD-bw*Mb-dlay*-cwn.tr' --min-time 20 -j 8
+# One row per run in cwnd-cycles.csv: cycle period, peak/trough window,
+# reduction and growth slope, the mean gap between drop batches of the
+# matching -drp.tr, and gap_estimate, which falls back to the cycle period
+# when the run has too few drop batches.
+# The cwnd trace follows a single socket, so when the drop trace holds several
+# flows (multi-topo.cc) only the drops of that flow's dest_port are used.
+
+# Port of the flow whose cwnd multi-topo.cc traces (the first source, node 1)
+TRACED_PORT = 50000
+
+def flow_drop_times(drop_file, dest_port):
+    # Drop timestamps of the traced flow
+    drops = load_drop_trace(drop_file)
+    if 'dest_port' in drops and drops['dest_port'].nunique() > 1:
+        drops = drops[drops['dest_port'] == dest_port]
+    return drops['timestamp'].to_numpy()
+
+def run_cycles(cwnd_file, threshold, min_reduction, min_time, match_window, min_gaps, cycles_dir, dest_port):
+    run = parse_run_name(cwnd_file, TRACE_NAME) or {}
+    drop_file = companion_trace(cwnd_file, 'drp')
+    try:
+        times, cwnd = load_cwnd_trace(cwnd_file)
+        drop_times = flow_drop_times(drop_file, dest_port) if drop_file else np.array([])
+    except Exception as e:
+        print(f"Error reading {cwnd_file}: {e}")
+        return None
+
+    after = times >= min_time
+    cycles = extract_cycles(times[after], cwnd[after], threshold, min_reduction)
+    row = {'run': os.path.basename(cwnd_file).replace('-cwn.tr', ''), 'qdisc': run.get('qdisc'),
+           'bandwidth': run.get('bandwidth'), 'delay': run.get('delay'), 'buffer': run.get('buffer'),
+           'has_drops': drop_file is not None}
+    row.update(cross_check(cycles, drop_times[drop_times >= min_time], threshold, match_window, min_gaps))
+
+    if cycles_dir:
+        table = pd.DataFrame({
+            'decrease_time': cycles.decrease_times,
+            'peak': cycles.peaks,
+            'trough': cycles.troughs,
+            'reduction': cycles.reductions,
+            'period': np.append(cycles.periods, np.nan),
+            'slope': np.append(cycles.slopes, np.nan),
+        })
+        table.to_csv(os.path.join(cycles_dir, row['run'] + '-cycles.csv'), index=False)
+    return row
+
+def main():
+    parser = argparse.ArgumentParser(description='Congestion window sawtooth cycles of every run')
+    parser.add_argument('pattern', nargs='?', default='FQCD-bw*Mb-dlay*-cwn.tr', help='glob of the cwnd traces')
+    parser.add_argument('--threshold', type=float, default=0.34,
+                        help='gap (s) that separates decreases, and drop batches')
+    parser.add_argument('--min-reduction', type=float, default=0.2,
+                        help='smallest relative window reduction that counts as a decrease')
+    parser.add_argument('--min-time', type=float, default=0, help='ignore records before this time (s)')
+    parser.add_argument('--match-window', type=float, default=1.0,
+                        help='largest drop-to-decrease lag (s) for a decrease to match a drop batch')
+    parser.add_argument('--min-gaps', type=int, default=3,
+                        help='drop batch gaps needed to trust the drop estimate over the cwnd one')
+    parser.add_argument('--dest-port', type=int, default=TRACED_PORT,
+                        help='flow of the cwnd trace, used when the drop trace holds several flows')
+    parser.add_argument('--cycles-dir', help='also write the cycles of every run to this directory')
+    parser.add_argument('--output', default='cwnd-cycles.csv', help='CSV with one row per run')
+    parser.add_argument('-j', '--jobs', type=int, help='worker processes (default: one per CPU)')
+    args = parser.parse_args()
+
+    file_list = sorted(glob.glob(args.pattern))
+    if not file_list:
+        print("No cwnd traces found.")
+        return
+    if args.cycles_dir:
+        os.makedirs(args.cycles_dir, exist_ok=True)
+
+    cycles = partial(run_cycles, threshold=args.threshold, min_reduction=args.min_reduction,
+                     min_time=args.min_time, match_window=args.match_window, min_gaps=args.min_gaps,
+                     cycles_dir=args.cycles_dir, dest_port=args.dest_port)
+    rows = [row for row in parallel_map(cycles, file_list, jobs=args.jobs) if row is not None]
+    if not rows:
+        print("No data to process.")
+        return
+    table = pd.DataFrame(rows)
+    table.to_csv(args.output, index=False)
+    print(table[['run', 'n_cycles', 'cycle_period_mean', 'batch_gap_mean', 'period_ratio',
+                 'matched_fraction', 'gap_estimate', 'gap_source']].to_string(index=False))
+    print(f"{len(table)} runs written to {args.output}")
+
+if __name__ == '__main__':
+    main()
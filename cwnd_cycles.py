@@ -0,0 +1,105 @@
+from collections import namedtuple
+
+import numpy as np
+
+from batching import segment_batches
+
+# Sawtooth cycles of a congestion window trace (-cwn.tr).
+# A cycle starts at a multiplicative decrease: the window falls from its peak
+# to a trough, then grows until the next decrease. ns-3 logs the decrease as
+# several records (fast recovery inflation/deflation, per-ACK reductions), so
+# the decreasing records (np.diff(cwnd) < 0) are grouped with the same gap
+# threshold as the drop batches (batching.segment_batches), and a group only
+# counts as a decrease when it takes off at least min_reduction of the peak.
+# The cycle period is the flow's loss period, i.e. what the gap between drop
+# batches measures, and it can be read from the cwnd trace even when drops are
+# too sparse to average.
+
+CwndCycles = namedtuple('CwndCycles', [
+    'decrease_times',  # time of the first decreasing record of every decrease
+    'peaks',           # window before every decrease (bytes)
+    'troughs',         # window after every decrease (bytes)
+    'trough_times',    # time of the last decreasing record of every decrease
+    'reductions',      # 1 - trough / peak
+    'periods',         # time between consecutive decreases (s)
+    'slopes',          # growth from every trough to the next peak (bytes/s)
+    'threshold',       # gap threshold used to group the decreasing records
+])
+
+
+def extract_cycles(times, cwnd, threshold, min_reduction=0.2):
+    # times must be sorted (ns-3 writes them in order)
+    times = np.asarray(times, dtype=np.float64)
+    cwnd = np.asarray(cwnd, dtype=np.float64)
+    decreasing = np.flatnonzero(np.diff(cwnd) < 0)
+    groups = segment_batches(times[decreasing + 1], threshold)
+
+    # Record before the first and after the last decrease of every group
+    end_index = np.append(groups.start_index[1:], decreasing.size) - 1
+    before = decreasing[groups.start_index]
+    after = decreasing[end_index] + 1 if decreasing.size else decreasing
+    peaks = cwnd[before]
+    troughs = cwnd[after]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        reductions = np.where(peaks > 0, 1 - troughs / peaks, 0.0)
+
+    keep = reductions >= min_reduction
+    before, after = before[keep], after[keep]
+    peaks, troughs, reductions = peaks[keep], troughs[keep], reductions[keep]
+    decrease_times = times[before + 1]
+    trough_times = times[after]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slopes = (peaks[1:] - troughs[:-1]) / (times[before[1:]] - trough_times[:-1])
+
+    return CwndCycles(
+        decrease_times=decrease_times,
+        peaks=peaks,
+        troughs=troughs,
+        trough_times=trough_times,
+        reductions=reductions,
+        periods=np.diff(decrease_times),
+        slopes=slopes,
+        threshold=groups.threshold,
+    )
+
+
+def decrease_lags(decrease_times, batch_starts):
+    # Time from the latest drop batch start to every window decrease (the
+    # sender reacts about an RTT after the drop), NaN before the first batch
+    index = np.searchsorted(batch_starts, decrease_times, side='right') - 1
+    lags = np.full(len(decrease_times), np.nan)
+    found = index >= 0
+    lags[found] = decrease_times[found] - batch_starts[index[found]]
+    return lags
+
+
+def cross_check(cycles, drop_times, threshold, match_window=1.0, min_gaps=3):
+    # Cycle statistics next to the drop batch statistics of the same run.
+    # gap_estimate is the mean gap between drop batches when there are at
+    # least min_gaps of them, the mean cwnd cycle period otherwise.
+    batches = segment_batches(drop_times, threshold)
+    lags = decrease_lags(cycles.decrease_times, batches.start_times)
+    matched = lags <= match_window  # NaN compares False
+
+    row = {
+        'n_cycles': len(cycles.decrease_times),
+        'cycle_period_mean': np.mean(cycles.periods) if len(cycles.periods) else np.nan,
+        'cycle_period_std': np.std(cycles.periods, ddof=1) if len(cycles.periods) > 1 else np.nan,
+        'peak_mean': np.mean(cycles.peaks) if len(cycles.peaks) else np.nan,
+        'trough_mean': np.mean(cycles.troughs) if len(cycles.troughs) else np.nan,
+        'reduction_mean': np.mean(cycles.reductions) if len(cycles.reductions) else np.nan,
+        'slope_mean': np.mean(cycles.slopes) if len(cycles.slopes) else np.nan,
+        'n_drops': len(drop_times),
+        'n_batches': len(batches.sizes),
+        'batch_gap_mean': np.mean(batches.inter_gaps) if len(batches.inter_gaps) else np.nan,
+        'matched_fraction': matched.mean() if len(matched) else np.nan,
+        'lag_median': np.nanmedian(lags) if np.any(~np.isnan(lags)) else np.nan,
+    }
+    row['period_ratio'] = row['cycle_period_mean'] / row['batch_gap_mean']
+    if len(batches.inter_gaps) >= min_gaps:
+        row['gap_estimate'], row['gap_source'] = row['batch_gap_mean'], 'drops'
+    elif len(cycles.periods):
+        row['gap_estimate'], row['gap_source'] = row['cycle_period_mean'], 'cwnd'
+    else:
+        row['gap_estimate'], row['gap_source'] = np.nan, 'none'
+    return row
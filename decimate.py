@@ -0,0 +1,124 @@
+import numpy as np
+
+# Pixel-level decimation for the SEQ/ACK scatter plots and buffer-length lines.
+# A 12 inch figure is ~1000 pixel columns wide, so drawing millions of packets
+# or a 250k sample buffer trace spends minutes on points that land on the same
+# pixels. Before anything is handed to matplotlib:
+#   - lines keep, per pixel column, the first, last, min and max sample
+#     (min/max envelope), so queue spikes and the sawtooth survive;
+#   - scatters keep one point per occupied (x pixel, y pixel) cell (density
+#     binning), so every pixel that would have been drawn is still drawn.
+# Decimator re-runs the decimation for the visible range whenever the axes
+# limits change, so zooming in brings back the full detail.
+
+OVERSAMPLE = 2  # bins per display pixel
+
+
+def _visible_slice(x, x_range):
+    # Indices of the sorted x inside x_range, plus one point on each side so
+    # lines leave the axes instead of stopping at the last visible sample
+    lo = max(np.searchsorted(x, x_range[0], side='left') - 1, 0)
+    hi = min(np.searchsorted(x, x_range[1], side='right') + 1, len(x))
+    return lo, hi
+
+
+def minmax_envelope(x, y, n_bins, x_range=None):
+    # x must be sorted. Returns the samples to draw, in x order.
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if x.size == 0:
+        return x, y
+    x_range = (x[0], x[-1]) if x_range is None else x_range
+    lo, hi = _visible_slice(x, x_range)
+    x, y = x[lo:hi], y[lo:hi]
+    if x.size <= 4 * n_bins or x_range[1] <= x_range[0]:
+        return x, y
+
+    bins = np.clip(((x - x_range[0]) / (x_range[1] - x_range[0]) * n_bins).astype(np.int64), -1, n_bins)
+    starts = np.flatnonzero(np.concatenate(([True], bins[1:] != bins[:-1])))
+    ends = np.append(starts[1:], x.size) - 1
+    # Within every bin, sorted by y: first is the min, last is the max
+    by_y = np.lexsort((y, bins))
+    keep = np.unique(np.concatenate((starts, ends, by_y[starts], by_y[ends])))
+    return x[keep], y[keep]
+
+
+def density_decimate(x, y, x_bins, y_bins, x_range=None, y_range=None):
+    # One point per occupied (x, y) cell, points outside the ranges are dropped.
+    # The kept point is a real sample, so positions are exact.
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if x.size <= x_bins * 2:
+        return x, y
+    x_range = (x.min(), x.max()) if x_range is None else x_range
+    y_range = (y.min(), y.max()) if y_range is None else y_range
+
+    inside = (x >= x_range[0]) & (x <= x_range[1]) & (y >= y_range[0]) & (y <= y_range[1])
+    index = np.flatnonzero(inside)
+    x_span = max(x_range[1] - x_range[0], np.finfo(float).tiny)
+    y_span = max(y_range[1] - y_range[0], np.finfo(float).tiny)
+    xb = np.minimum(((x[index] - x_range[0]) / x_span * x_bins).astype(np.int64), x_bins - 1)
+    yb = np.minimum(((y[index] - y_range[0]) / y_span * y_bins).astype(np.int64), y_bins - 1)
+    _, first = np.unique(xb * y_bins + yb, return_index=True)
+    keep = index[np.sort(first)]
+    return x[keep], y[keep]
+
+
+def axes_pixels(ax):
+    # Size of the axes in display pixels
+    bbox = ax.get_window_extent()
+    return max(int(bbox.width), 1), max(int(bbox.height), 1)
+
+
+class Decimator:
+    # Draws decimated scatters / lines on one Axes and re-decimates them from the
+    # full data when the view limits change (zoom, pan, twinx sharing x).
+
+    def __init__(self, ax, oversample=OVERSAMPLE):
+        self.ax = ax
+        self.oversample = oversample
+        self.scatters = []
+        self.lines = []
+        self.updating = False
+        # Bound methods are only weakly referenced by matplotlib, a lambda keeps
+        # the Decimator alive as long as its Axes
+        ax.callbacks.connect('xlim_changed', lambda ax: self.update())
+        ax.callbacks.connect('ylim_changed', lambda ax: self.update())
+
+    def scatter(self, x, y, **kwargs):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        width, height = axes_pixels(self.ax)
+        shown = density_decimate(x, y, width * self.oversample, height * self.oversample)
+        artist = self.ax.scatter(*shown, **kwargs)
+        self.scatters.append((artist, x, y))
+        return artist
+
+    def plot(self, x, y, **kwargs):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        order = np.argsort(x, kind='stable')
+        x, y = x[order], y[order]
+        width, _ = axes_pixels(self.ax)
+        line, = self.ax.plot(*minmax_envelope(x, y, width * self.oversample), **kwargs)
+        self.lines.append((line, x, y))
+        return line
+
+    def update(self):
+        # Redo the decimation for the current view
+        if self.updating:
+            return
+        self.updating = True
+        try:
+            x_range = self.ax.get_xlim()
+            y_range = self.ax.get_ylim()
+            width, height = axes_pixels(self.ax)
+            for artist, x, y in self.scatters:
+                shown = density_decimate(x, y, width * self.oversample, height * self.oversample,
+                                         sorted(x_range), sorted(y_range))
+                artist.set_offsets(np.column_stack(shown))
+            for line, x, y in self.lines:
+                line.set_data(*minmax_envelope(x, y, width * self.oversample, sorted(x_range)))
+            self.ax.figure.canvas.draw_idle()
+        finally:
+            self.updating = False
@@ -0,0 +1,72 @@
+import argparse
+import glob
+import os
+from functools import partial
+
+import pandas as pd
+
+from signals import drop_state_summary, enrich_drops
+from sweep_cache import parse_run_name
+from trace_loader import companion_trace, load_buffer_trace, load_cwnd_trace, load_drop_trace
+from trace_pool import parallel_map
+
+# Queue length and sender cwnd at every drop, to tell early (RED/CoDel) drops
+# from tail drops. For every -drp.tr the -buf and -cwn traces of the same run
+# are looked up as of each drop timestamp (signals.enrich_drops) and the
+# enriched drop table is written next to it, or to --outdir:
+#   python enrich-drops.py 'RED-bw*Mb-dlay*-drp.tr' -j 8
+# A drop is a tail drop when the queue was at the run's buffer size (-b<n>p in
+# the file name, or --queue-limit).
+
+def enrich_run(drop_file, outdir, queue_limit):
+    run = parse_run_name(drop_file) or {}
+    limit = queue_limit if queue_limit is not None else run.get('buffer')
+    buffer_file = companion_trace(drop_file, 'buf')
+    cwnd_file = companion_trace(drop_file, 'cwn')
+    try:
+        drops = load_drop_trace(drop_file)
+        buffer = load_buffer_trace(buffer_file) if buffer_file else None
+        cwnd = load_cwnd_trace(cwnd_file) if cwnd_file else None
+    except Exception as e:
+        return drop_file, None, f"error {e}"
+
+    enriched = enrich_drops(drops, buffer, cwnd, queue_limit=limit)
+    out_path = os.path.join(outdir or os.path.dirname(drop_file),
+                            os.path.basename(drop_file).replace('-drp.tr', '') + '-drp-state.csv')
+    enriched.to_csv(out_path, index=False)
+    summary = drop_state_summary(enriched)
+    summary['run'] = os.path.basename(drop_file).replace('-drp.tr', '')
+    summary['has_buffer'] = buffer_file is not None
+    summary['has_cwnd'] = cwnd_file is not None
+    return drop_file, summary, out_path
+
+def main():
+    parser = argparse.ArgumentParser(description='Annotate every drop with the queue length and cwnd at that time')
+    parser.add_argument('pattern', nargs='?', default='FQCD-bw*Mb-dlay*-drp.tr', help='glob of the drop traces')
+    parser.add_argument('--outdir', help='directory for the enriched tables (default: next to the traces)')
+    parser.add_argument('--queue-limit', type=int, help='queue size in packets (default: from the file name)')
+    parser.add_argument('--summary', default='drop-state-summary.csv', help='CSV with one row per run')
+    parser.add_argument('-j', '--jobs', type=int, help='worker processes (default: one per CPU)')
+    args = parser.parse_args()
+
+    file_list = sorted(glob.glob(args.pattern))
+    if not file_list:
+        print("No drop traces found.")
+        return
+    if args.outdir:
+        os.makedirs(args.outdir, exist_ok=True)
+
+    summaries = []
+    for drop_file, summary, message in parallel_map(partial(enrich_run, outdir=args.outdir, queue_limit=args.queue_limit),
+                                                    file_list, jobs=args.jobs):
+        print(f"{drop_file}: {message}")
+        if summary is not None:
+            summaries.append(summary)
+    if summaries:
+        table = pd.DataFrame(summaries)
+        table = table[['run'] + [c for c in table.columns if c != 'run']]
+        table.to_csv(args.summary, index=False)
+        print(f"Summary of {len(table)} runs written to {args.summary}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+
+from decimate import Decimator
+
+# Figure drawing shared by the interactive plotters and render-sweep.py.
+# The draw_* functions only draw on the Axes they are given, the callers decide
+# whether to plt.show() or save, and which matplotlib backend is used.
+
+def draw_seq_ack_buffer(ax1, sent_times, sent_seqs, ack_times, ack_acks, buffer_times, buffer_lengths, drop_times, drop_seqs):
+    # Plot SEQ and ACKs, decimated to the pixels they cover (redone on zoom)
+    seq_ack = Decimator(ax1)
+    seq_ack.scatter(sent_times, sent_seqs, s=0.1, color='blue', label='Sent Seq')
+    seq_ack.scatter(ack_times, ack_acks, s=0.05, alpha=0.4, color='red', label='ACKs')
+    ax1.scatter(drop_times, drop_seqs, s=50, marker='x', color='black', label='Drops')
+
+    ax1.set_xlabel('Time (s)')
+    ax1.set_ylabel('Sequence / Acknowledgment Number')
+    ax1.tick_params(axis='y')
+    ax1.grid(True)
+
+    ax2 = ax1.twinx()
+    Decimator(ax2).plot(buffer_times, buffer_lengths, color='green', label='Buffer Length (packets)', alpha=0.4)
+
+    ax2.set_ylabel('Buffer Length (packets)', color='green')
+    ax2.tick_params(axis='y', labelcolor='green')
+
+    lines_1, labels_1 = ax1.get_legend_handles_labels()
+    lines_2, labels_2 = ax2.get_legend_handles_labels()
+    ax1.legend(lines_1 + lines_2, labels_1 + labels_2, loc='upper left')
+    return ax2
+
+def draw_gap_histogram(ax, time_gaps, title):
+    mean_gap = np.mean(time_gaps)
+    # Gaps equal up to rounding (a perfectly periodic run) go in a single bin,
+    # matplotlib cannot split a range of a few ulps into 20
+    constant = np.ptp(time_gaps) <= 1e-9 * max(abs(mean_gap), 1.0)
+    ax.hist(time_gaps, bins=1 if constant else 20, edgecolor='black', alpha=0.7)
+    ax.axvline(mean_gap, color='red', linestyle='dashed', linewidth=1)
+    # Label next to the line: x in data, y in axes coordinates, so it stays
+    # inside the axes however narrow the gap range is (a data offset such as
+    # mean_gap * 1.05 can land far off the axes and blow up bbox_inches='tight')
+    ax.text(mean_gap, 0.9, f' Mean: {mean_gap:.2f}s', color='red',
+            transform=ax.get_xaxis_transform(), clip_on=True)
+    ax.set_title(title)
+    ax.set_xlabel('Time Gap Between Batches (s)')
+    ax.set_ylabel('Frequency')
+
+def draw_gap_heatmap(ax, df):
+    import seaborn as sns
+
+    # Create a pivot table with bandwidth as rows, delay as columns, and delta_time as values
+    pivot_table = df.pivot_table(values='avg_time_diff_between_batches', index='bandwidth', columns='delay', aggfunc='mean')
+
+    sns.heatmap(pivot_table, annot=False, fmt=".2f", cmap='viridis', ax=ax)
+    ax.set_title('Average Delta Time Heatmap')
+    ax.set_ylabel('Bandwidth (Mbps)')
+    ax.set_xlabel('Delay (ms)')
+
+def figure_paths(out_base, formats):
+    return [f"{out_base}.{fmt}" for fmt in formats]
+
+def is_up_to_date(outputs, inputs):
+    # Every output exists and is newer than every input
+    inputs = [path for path in inputs if path and os.path.exists(path)]
+    if not all(os.path.exists(path) for path in outputs):
+        return False
+    if not inputs:
+        return True
+    return min(os.path.getmtime(path) for path in outputs) >= max(os.path.getmtime(path) for path in inputs)
+
+def save_figure(fig, out_base, formats):
+    paths = figure_paths(out_base, formats)
+    for path in paths:
+        fig.savefig(path, dpi=150, bbox_inches='tight')
+    return paths
@@ -1,100 +1,26 @@
-from scapy.all import rdpcap, TCP, IP, PPP
 import matplotlib.pyplot as plt
+import numpy as np
 import os
 
-# the 3 flow plotter that plots the buffer, and 3 flows
-
-def parse_pcap(file_path, sender_ip, receiver_ip):
-    sent_times = []
-    sent_seqs = []
-    ack_times = []
-    ack_acks = []
-
-    packets = rdpcap(file_path)
-
-    for pkt in packets:
-        try:
-            # Check if the packet has PPP layer
-            if PPP in pkt:
-                ip_pkt = pkt[PPP][IP]
-            elif IP in pkt:
-                ip_pkt = pkt[IP]
-            else:
-                continue
-
-            if TCP not in ip_pkt:
-                continue
-
-            tcp_pkt = ip_pkt[TCP]
-
-            src_ip = ip_pkt.src
-            dst_ip = ip_pkt.dst
-
-            # Check if packet is s->r
-            if src_ip == sender_ip and dst_ip == receiver_ip:
-                # Extract SEQ
-                sent_times.append(pkt.time)
-                sent_seqs.append(tcp_pkt.seq)
-            # Check if packet is r->s
-            elif src_ip == receiver_ip and dst_ip == sender_ip:
-                # Extract ACK
-                ack_times.append(pkt.time)
-                ack_acks.append(tcp_pkt.ack)
-        except Exception as e:
-            print("Error in parse pcap")
-            continue
-        
-    return sent_times, sent_seqs, ack_times, ack_acks
+from decimate import Decimator
+from pcap_reader import demux_flows, flow_seq_ack
+from signals import common_start
+from trace_loader import load_buffer_trace, load_drop_trace
 
+# the 3 flow plotter that plots the buffer, and 3 flows
 
 def parse_buffer_log(buffer_log_file):
-    buffer_times = []
-    buffer_lengths = []
-    with open(buffer_log_file, 'r') as f:
-        # Assuming the buffer file has two columns: timestamp_ms and buffer_length_packets
-        next(f)  # Skip header line, if any
-        for line in f:
-            parts = line.strip().split('\t')
-            if len(parts) != 2:
-                continue
-            timestamp_sec = float(parts[0])
-            buffer_length_packets = int(parts[1])
-            buffer_times.append(timestamp_sec)
-            buffer_lengths.append(buffer_length_packets)
-    return buffer_times, buffer_lengths
-
-def parse_buffer_log(buffer_log_file):
-    buffer_times = []
-    buffer_lengths = []
-    with open(buffer_log_file, 'r') as f:
-        next(f)  # Skip header line, if any
-        for line in f:
-            parts = line.strip().split('\t')
-            if len(parts) != 2:
-                continue
-            timestamp_sec = float(parts[0])
-            buffer_length_packets = int(parts[1])
-            buffer_times.append(timestamp_sec)
-            buffer_lengths.append(buffer_length_packets)
-    return buffer_times, buffer_lengths
+    # Text, binary or compact (-buf.npz) queue length trace
+    return load_buffer_trace(buffer_log_file)
 
 def parse_drop_log(drop_log_file):
+    # Drop times and seqs keyed by dest_port
+    drops = load_drop_trace(drop_log_file)
     drop_times = {}
     drop_seqs = {}
-    with open(drop_log_file, 'r') as f:
-        next(f)  # Skip header line, if any
-        for line in f:
-            parts = line.strip().split('\t')
-            if len(parts) < 3:
-                continue
-            timestamp_sec = float(parts[0])
-            seq_num = int(parts[1])
-            dest_port = int(parts[2])
-            if dest_port not in drop_times:
-                drop_times[dest_port] = []
-                drop_seqs[dest_port] = []
-            drop_times[dest_port].append(timestamp_sec)
-            drop_seqs[dest_port].append(seq_num)
+    for dest_port, flow_drops in drops.groupby('dest_port'):
+        drop_times[dest_port] = flow_drops['timestamp'].to_numpy()
+        drop_seqs[dest_port] = flow_drops['seq'].to_numpy()
     return drop_times, drop_seqs
 
 def plot_seq_ack_buffer(sent_times_list, sent_seqs_list, ack_times_list, ack_acks_list, buffer_times, buffer_lengths, drop_times_dict, drop_seqs_dict, flow_ports, plot_title):
@@ -102,6 +28,9 @@ def plot_seq_ack_buffer(sent_times_list, sent_seqs_list, ack_times_list, ack_ack
 
     colors = ['blue', 'purple', 'red', 'gray', 'olive', 'cyan']
 
+    # Sent sequences are decimated to the pixels they cover (redone on zoom)
+    seqs = Decimator(ax1)
+
     num_flows = len(flow_ports)
 
     for idx in range(num_flows):
@@ -114,7 +43,7 @@ def plot_seq_ack_buffer(sent_times_list, sent_seqs_list, ack_times_list, ack_ack
 
         # Plot Sent Sequences
         
-        ax1.scatter(sent_times_list[idx], sent_seqs_list[idx], s=0.5, color=color, label=label_sent)
+        seqs.scatter(sent_times_list[idx], sent_seqs_list[idx], s=0.5, color=color, label=label_sent)
 
 
         # Plot Drops
@@ -127,7 +56,7 @@ def plot_seq_ack_buffer(sent_times_list, sent_seqs_list, ack_times_list, ack_ack
     ax1.grid(True)
 
     ax2 = ax1.twinx()
-    ax2.plot(buffer_times, buffer_lengths, color='green', label='Buffer Length (packets)', alpha=0.4)
+    Decimator(ax2).plot(buffer_times, buffer_lengths, color='green', label='Buffer Length (packets)', alpha=0.4)
 
     ax2.set_ylabel('Buffer Length (packets)', color='green')
     ax2.tick_params(axis='y', labelcolor='green')
@@ -153,9 +82,12 @@ def main():
     ack_times_list = []
     ack_acks_list = []
 
-    for idx, pcap_file in enumerate(pcap_files):
-        sender_ip = sender_ips[idx]
-        sent_times, sent_seqs, ack_times, ack_acks = parse_pcap(pcap_file, sender_ip, receiver_ip)
+    # Read every capture once and split the packets per flow
+    flows = demux_flows(pcap_files)
+
+    for idx, sender_ip in enumerate(sender_ips):
+        sent_times, sent_seqs, ack_times, ack_acks = flow_seq_ack(flows, sender_ip, receiver_ip, flow_ports[idx])
+        sent_seqs, ack_acks = sent_seqs.astype(np.int64), ack_acks.astype(np.int64)
         sent_times_list.append(sent_times)
         sent_seqs_list.append(sent_seqs)
         ack_times_list.append(ack_times)
@@ -166,48 +98,38 @@ def main():
     drop_times_dict, drop_seqs_dict = parse_drop_log(drop_log_file)
 
     # Align the timestamps
-    all_times = []
-    for times in sent_times_list:
-        all_times.extend(times)
-    for times in ack_times_list:
-        all_times.extend(times)
-    all_times.extend(buffer_times)
-    for times in drop_times_dict.values():
-        all_times.extend(times)
-
-    if not all_times:
+    start_time = common_start(*sent_times_list, *ack_times_list, buffer_times, *drop_times_dict.values())
+
+    if start_time is None:
         print("No data found.")
         return
-    start_time = min(all_times)
 
     # Adjust times and sequences per flow
     for idx in range(len(flow_ports)):
-        sent_times_list[idx] = [t - start_time for t in sent_times_list[idx]]
-        ack_times_list[idx] = [t - start_time for t in ack_times_list[idx]]
-
-        
+        port = flow_ports[idx]
+        sent_times_list[idx] = sent_times_list[idx] - start_time
+        ack_times_list[idx] = ack_times_list[idx] - start_time
+        if port in drop_times_dict:
+            drop_times_dict[port] = drop_times_dict[port] - start_time
 
-        if sent_seqs_list[idx]:
+        if len(sent_seqs_list[idx]):
             start_seq = sent_seqs_list[idx][0]
-            sent_seqs_list[idx] = [s - start_seq for s in sent_seqs_list[idx]]
+            sent_seqs_list[idx] = sent_seqs_list[idx] - start_seq
         else:
-            print(f"No sent sequences found for flow {flow_ports[idx]}.")
-            sent_seqs_list[idx] = []
+            print(f"No sent sequences found for flow {port}.")
+            continue
 
-        if ack_acks_list[idx]:
-            ack_acks_list[idx] = [a - start_seq for a in ack_acks_list[idx]]
+        if len(ack_acks_list[idx]):
+            ack_acks_list[idx] = ack_acks_list[idx] - start_seq
         else:
-            print(f"No ACKs found for flow {flow_ports[idx]}.")
-            ack_acks_list[idx] = []
+            print(f"No ACKs found for flow {port}.")
 
         # Adjust drop sequences
-        port = flow_ports[idx]
         if port in drop_times_dict:
-            drop_times_dict[port] = [t - start_time for t in drop_times_dict[port]]
-            drop_seqs_dict[port] = [s - start_seq for s in drop_seqs_dict[port]]
+            drop_seqs_dict[port] = drop_seqs_dict[port] - start_seq
 
     # Adjust buffer times
-    buffer_times = [t - start_time for t in buffer_times]
+    buffer_times = buffer_times - start_time
 
     plot_title = "TCP Flows with Buffer and Drops"
     plot_seq_ack_buffer(sent_times_list, sent_seqs_list, ack_times_list, ack_acks_list, buffer_times, buffer_lengths, drop_times_dict, drop_seqs_dict, flow_ports, plot_title)
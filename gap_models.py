@@ -0,0 +1,288 @@
+import itertools
+import json
+from collections import Counter, namedtuple
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from trace_pool import parallel_map
+
+# Candidate regression models of the per-run sweep statistics (average gap
+# between drop batches, average drops per batch) over bandwidth, delay and
+# buffer, compared with k-fold cross-validation.
+#
+# A model is a list of terms; a term is a product of feature powers, e.g.
+# (('bandwidth', 1), ('delay', 2)) is bandwidth * delay^2. Every model is an
+# ordinary least squares fit of its terms plus an intercept, solved with one
+# np.linalg.lstsq call on the standardised design matrix, and the
+# coefficients are stored for the raw features so a saved model is just a
+# small JSON document (see save_models / predict_model).
+
+MODEL_VERSION = 1
+DEFAULT_FOLDS = 5
+TARGETS = ['avg_time_diff_between_batches', 'avg_drops_per_batch']
+# GapPrediction field of each target
+TARGET_FIELDS = {'avg_time_diff_between_batches': 'gap', 'avg_drops_per_batch': 'drops_per_batch'}
+BASE_COLUMNS = ['bandwidth', 'delay', 'buffer']
+
+
+def feature_columns(bandwidth, delay, buffer):
+    # Features the terms can use, from the bandwidth (Mbps), delay (ms, the RTT,
+    # i.e. the dlay of the run name) and buffer size (packets) arrays
+    bandwidth = np.asarray(bandwidth, dtype=np.float64)
+    delay = np.asarray(delay, dtype=np.float64)
+    buffer = np.broadcast_to(np.asarray(buffer, dtype=np.float64), bandwidth.shape)
+    return {
+        'bandwidth': bandwidth,
+        'delay': delay,
+        'buffer': buffer,
+        'log_bandwidth': np.log(bandwidth),
+        'log_delay': np.log(delay),
+    }
+
+
+def polynomial_terms(features, degree):
+    # Every monomial of the features up to the total degree, without the constant
+    terms = []
+    for total in range(1, degree + 1):
+        for combo in itertools.combinations_with_replacement(features, total):
+            terms.append(tuple(Counter(combo).items()))
+    return terms
+
+
+# The sawtooth forms come from a Reno-like flow: it loses a batch once per
+# congestion window cycle, the window peaks at the path BDP plus the buffer,
+# (bw * rtt + buffer) packets, and halving it takes that many / 2 RTTs to grow
+# back, so gap ~ bw * delay^2 + buffer * delay.
+CANDIDATES = {
+    'poly1': polynomial_terms(['bandwidth', 'delay'], 1),
+    'poly2': polynomial_terms(['bandwidth', 'delay'], 2),
+    'poly3': polynomial_terms(['bandwidth', 'delay'], 3),
+    'log1': polynomial_terms(['log_bandwidth', 'log_delay'], 1),
+    'log2': polynomial_terms(['log_bandwidth', 'log_delay'], 2),
+    'sawtooth': [(('bandwidth', 1), ('delay', 2)), (('buffer', 1), ('delay', 1))],
+    'sawtooth_linear': [(('bandwidth', 1), ('delay', 2)), (('buffer', 1), ('delay', 1)),
+                        (('bandwidth', 1),), (('delay', 1),)],
+    'inverse_bandwidth': [(('bandwidth', -1),), (('delay', 1),), (('bandwidth', -1), ('delay', 1))],
+}
+
+
+def term_name(term):
+    return '*'.join(name if power == 1 else f"{name}^{power}" for name, power in term)
+
+
+def design_matrix(columns, terms):
+    # (n, len(terms)) matrix of the term values
+    n = len(next(iter(columns.values())))
+    X = np.ones((n, len(terms)), order='F')  # filled column by column
+    for j, term in enumerate(terms):
+        for name, power in term:
+            X[:, j] *= columns[name] if power == 1 else columns[name] ** power
+    return X
+
+
+def standardization(X):
+    # Columns that only vary by rounding (e.g. log_delay^2 of a single delay)
+    # count as constant
+    mean = X.mean(axis=0)
+    scale = X.std(axis=0)
+    scale[scale <= 1e-9 * np.maximum(np.abs(mean), 1.0)] = 1.0
+    return mean, scale
+
+
+def fit_terms(X, y):
+    # Least squares fit of y = X @ coef + intercept. The columns are
+    # standardised first so bandwidth^3 and log_delay are equally well
+    # conditioned; constant columns (e.g. one delay in the sweep) get a zero
+    # coefficient. Returns (coef, intercept, rank) for the raw columns.
+    mean, scale = standardization(X)
+    y_mean = y.mean()
+    coef, _, rank, _ = np.linalg.lstsq((X - mean) / scale, y - y_mean, rcond=None)
+    coef = coef / scale
+    return coef, y_mean - mean @ coef, int(rank)
+
+
+def kfold_indices(n, folds, seed=0):
+    # Shuffled test index arrays of the folds (leave-one-out when n < folds)
+    order = np.random.default_rng(seed).permutation(n)
+    return np.array_split(order, min(folds, n))
+
+
+def cv_fold(task, columns, y, folds):
+    # Out-of-fold predictions of one (model, fold) pair (run in a worker process)
+    name, terms, fold = task
+    test = folds[fold]
+    train = np.setdiff1d(np.arange(len(y)), test)
+    X = design_matrix(columns, terms)
+    coef, intercept, _ = fit_terms(X[train], y[train])
+    return name, test, X[test] @ coef + intercept
+
+
+def scores(y, y_pred, n_params):
+    # R^2, MSE and AIC (Gaussian errors, n_params includes the intercept)
+    residuals = y - y_pred
+    rss = float(np.sum(residuals ** 2))
+    tss = float(np.sum((y - y.mean()) ** 2))
+    n = len(y)
+    return {
+        'r2': 1 - rss / tss if tss > 0 else np.nan,
+        'mse': rss / n,
+        'aic': n * np.log(max(rss, np.finfo(float).tiny) / n) + 2 * n_params,
+    }
+
+
+def training_columns(data_df):
+    return feature_columns(data_df['bandwidth'], data_df['delay'], data_df['buffer'])
+
+
+def fit_model(name, terms, data_df, target):
+    # Model fitted on all the rows, as a JSON-friendly dict
+    y = data_df[target].to_numpy(dtype=np.float64)
+    X = design_matrix(training_columns(data_df), terms)
+    coef, intercept, rank = fit_terms(X, y)
+    y_pred = X @ coef + intercept
+    # For the prediction uncertainty: (Z'Z)^+ of the standardised, centred
+    # design Z, so var(prediction) = s^2 (1/n + z (Z'Z)^+ z')
+    mean, scale = standardization(X)
+    Z = (X - mean) / scale
+    return {
+        'name': name,
+        'target': target,
+        'terms': [[list(factor) for factor in term] for term in terms],
+        'coefficients': coef.tolist(),
+        'intercept': float(intercept),
+        'n_params': rank + 1,
+        'n_samples': len(y),
+        'residual_std': float(np.std(y - y_pred, ddof=min(rank + 1, len(y) - 1))),
+        'feature_mean': mean.tolist(),
+        'feature_scale': scale.tolist(),
+        'inverse_gram': np.linalg.pinv(Z.T @ Z).tolist(),
+        'ranges': {column: [float(data_df[column].min()), float(data_df[column].max())]
+                   for column in BASE_COLUMNS},
+        'default_buffer': float(data_df['buffer'].median()),
+        'metrics': scores(y, y_pred, rank + 1),
+    }
+
+
+def evaluate_models(data_df, target, candidates=CANDIDATES, folds=DEFAULT_FOLDS, jobs=None, seed=0):
+    # Fit every candidate model on data_df and cross-validate it with k folds,
+    # the (model, fold) fits spread over jobs worker processes.
+    # Returns (table sorted by CV MSE, {model name: fitted model}).
+    data_df = data_df[data_df[target].notna()].reset_index(drop=True)
+    if len(data_df) < 2:
+        raise ValueError(f"need at least 2 runs with {target} to cross-validate, got {len(data_df)}")
+    y = data_df[target].to_numpy(dtype=np.float64)
+    columns = training_columns(data_df)
+    test_folds = kfold_indices(len(y), folds, seed)
+
+    tasks = [(name, terms, fold) for name, terms in candidates.items() for fold in range(len(test_folds))]
+    out_of_fold = {name: np.empty(len(y)) for name in candidates}
+    for name, test, y_pred in parallel_map(partial(cv_fold, columns=columns, y=y, folds=test_folds), tasks, jobs=jobs):
+        out_of_fold[name][test] = y_pred
+
+    models = {}
+    rows = []
+    for name, terms in candidates.items():
+        model = fit_model(name, terms, data_df, target)
+        cv = scores(y, out_of_fold[name], model['n_params'])
+        model['metrics'].update(cv_r2=cv['r2'], cv_mse=cv['mse'])
+        models[name] = model
+        rows.append({'model': name, 'n_params': model['n_params'], **model['metrics']})
+
+    table = pd.DataFrame(rows, columns=['model', 'n_params', 'r2', 'mse', 'aic', 'cv_r2', 'cv_mse'])
+    return table.sort_values(['cv_mse', 'aic']).reset_index(drop=True), models
+
+
+def predict_model(model, bandwidth, delay, buffer=None):
+    # Model predictions for arrays of points (buffer defaults to the training one)
+    buffer = model['default_buffer'] if buffer is None else buffer
+    X = design_matrix(feature_columns(bandwidth, delay, buffer), model['terms'])
+    return X @ np.asarray(model['coefficients']) + model['intercept']
+
+
+def prediction_std(model, X):
+    # Standard deviation of a new observation at the design rows X: residual
+    # noise plus the uncertainty of the fitted coefficients
+    Z = (X - np.asarray(model['feature_mean'])) / np.asarray(model['feature_scale'])
+    leverage = np.sum((Z @ np.asarray(model['inverse_gram'])) * Z, axis=1)
+    return model['residual_std'] * np.sqrt(1 + 1 / model['n_samples'] + leverage)
+
+
+def format_equation(model):
+    terms = [f"{coef:.4g} * {term_name(term)}" for coef, term in zip(model['coefficients'], model['terms'])]
+    return f"{model['target']} = {' + '.join(terms)} + {model['intercept']:.4g}"
+
+
+def save_models(models, file_path, **meta):
+    # models: {target: fitted model}; meta is stored as is (e.g. batch settings)
+    with open(file_path, 'w') as f:
+        json.dump({'version': MODEL_VERSION, **meta, 'models': models}, f, indent=1)
+
+
+def load_models(file_path):
+    with open(file_path, 'r') as f:
+        doc = json.load(f)
+    if doc.get('version') != MODEL_VERSION:
+        raise ValueError(f"{file_path}: unsupported model version {doc.get('version')}")
+    return doc
+
+
+GapPrediction = namedtuple('GapPrediction', [
+    'gap',                  # predicted average gap between drop batches (s)
+    'gap_std',              # its standard deviation (residuals + fit uncertainty)
+    'drops_per_batch',      # predicted average drops per batch
+    'drops_per_batch_std',
+    'out_of_grid',          # True where a point is outside the simulated ranges
+])
+
+
+class GapPredictor:
+    # Predicted sweep statistics at arbitrary (bandwidth, delay, buffer) points
+    # without running ns-3, from the models function_estimate.py saves:
+    #   predictor = GapPredictor.load('gap-model.json')
+    #   p = predictor.predict(bw_array, delay_array)
+    #   p.gap, p.gap_std, p.drops_per_batch, p.out_of_grid
+    # Everything is vectorised over the points, so millions of points take
+    # well under a second.
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.models = doc['models']
+        ranges = [model['ranges'] for model in self.models.values()]
+        # Points outside any model's training range are extrapolated
+        self.ranges = {column: (max(r[column][0] for r in ranges), min(r[column][1] for r in ranges))
+                       for column in BASE_COLUMNS}
+
+    @classmethod
+    def load(cls, file_path):
+        return cls(load_models(file_path))
+
+    def default_buffer(self):
+        return next(iter(self.models.values()))['default_buffer']
+
+    def out_of_grid(self, bandwidth, delay, buffer):
+        outside = np.zeros(bandwidth.shape, dtype=bool)
+        for column, values in zip(BASE_COLUMNS, (bandwidth, delay, buffer)):
+            low, high = self.ranges[column]
+            tolerance = 1e-9 * max(abs(low), abs(high), 1.0)
+            outside |= (values < low - tolerance) | (values > high + tolerance)
+        return outside
+
+    def predict(self, bandwidth, delay, buffer=None):
+        # Arrays (or scalars) of bandwidth (Mbps), delay (ms) and buffer
+        # (packets, default: the training buffer), broadcast against each other
+        buffer = self.default_buffer() if buffer is None else buffer
+        bandwidth, delay, buffer = (a.astype(np.float64) for a in np.broadcast_arrays(bandwidth, delay, buffer))
+        columns = feature_columns(bandwidth.ravel(), delay.ravel(), buffer.ravel())
+
+        fields = {}
+        for target, field in TARGET_FIELDS.items():
+            model = self.models.get(target)
+            if model is None:
+                fields[field] = fields[field + '_std'] = np.full(bandwidth.shape, np.nan)
+                continue
+            X = design_matrix(columns, model['terms'])
+            fields[field] = (X @ np.asarray(model['coefficients']) + model['intercept']).reshape(bandwidth.shape)
+            fields[field + '_std'] = prediction_std(model, X).reshape(bandwidth.shape)
+        return GapPrediction(out_of_grid=self.out_of_grid(bandwidth, delay, buffer), **fields)
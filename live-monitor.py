@@ -0,0 +1,171 @@
+import argparse
+import time
+from collections import deque
+
+import numpy as np
+
+from batching import OnlineBatchStats
+from trace_tail import TraceFollower
+
+# Follow the drop and buffer traces of a simulation that is still running and
+# print (optionally plot) batch gaps, drop rate and queue occupancy as new
+# records are appended, so a bad run can be stopped early.
+#   ./ns3 run "scratch/multi-topo.cc --dropTrFileName=run-drp.tr --bufTrFileName=run-buf.tr" &
+#   python live-monitor.py --drp run-drp.tr --buf run-buf.tr --plot
+# (lost-topo.cc only writes the buffer trace with its TraceBuffifo schedule
+# line uncommented, otherwise monitor its drops alone.)
+# Memory is bounded: batch statistics are online, and only the last --window
+# seconds of drops and the last --max-points queue samples / batch gaps are kept.
+
+class QueueStats:
+    # Running time-weighted queue length (each sample holds until the next one)
+    def __init__(self, max_points):
+        self.area = 0.0
+        self.duration = 0.0
+        self.max_qlen = 0
+        self.last_time = None
+        self.last_qlen = None
+        self.recent = deque(maxlen=max_points)
+
+    def update(self, times, qlens):
+        if len(times) == 0:
+            return
+        if self.last_time is not None:
+            times = np.concatenate(([self.last_time], times))
+            qlens = np.concatenate(([self.last_qlen], qlens))
+        held = np.diff(times)
+        self.area += np.sum(qlens[:-1] * held)
+        self.duration += times[-1] - times[0]
+        self.max_qlen = max(self.max_qlen, int(qlens.max()))
+        self.last_time, self.last_qlen = times[-1], qlens[-1]
+        self.recent.extend(zip(times.tolist(), qlens.tolist()))
+
+    def mean(self):
+        return self.area / self.duration if self.duration > 0 else np.nan
+
+class DropRate:
+    # Drops per second over the last window seconds of simulation time
+    def __init__(self, window):
+        self.window = window
+        self.times = deque()
+        self.first_time = None
+
+    def update(self, times):
+        if self.first_time is None and len(times):
+            self.first_time = times[0]
+        self.times.extend(times.tolist())
+        if self.times:
+            cutoff = self.times[-1] - self.window
+            while self.times and self.times[0] < cutoff:
+                self.times.popleft()
+
+    def rate(self):
+        # Shorter span at the start of the run
+        if not self.times:
+            return 0.0
+        span = min(self.window, self.times[-1] - self.first_time)
+        return len(self.times) / span if span > 0 else np.nan
+
+def seconds(value):
+    return '-' if np.isnan(value) else f"{value:.3f}s"
+
+def setup_plot():
+    import matplotlib.pyplot as plt
+    plt.ion()
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 7))
+    queue_line, = ax1.plot([], [], color='green')
+    ax1.set_xlabel('Time (s)')
+    ax1.set_ylabel('Buffer Length (packets)')
+    gap_line, = ax2.plot([], [], marker='o', color='blue')
+    ax2.set_xlabel('Batch start time (s)')
+    ax2.set_ylabel('Time Gap Between Batches (s)')
+    fig.tight_layout()
+    return plt, (ax1, ax2), (queue_line, gap_line)
+
+def refresh_plot(plot, queue, batch_starts):
+    plt, axes, lines = plot
+    if queue.recent:
+        times, qlens = zip(*queue.recent)
+        lines[0].set_data(times, qlens)
+    if len(batch_starts) > 1:
+        starts = np.array(batch_starts)
+        lines[1].set_data(starts[1:], np.diff(starts))
+    for ax in axes:
+        ax.relim()
+        ax.autoscale_view()
+    plt.pause(0.01)
+
+def main():
+    parser = argparse.ArgumentParser(description='Live statistics of the traces of a running simulation')
+    parser.add_argument('--drp', help='drop trace being written')
+    parser.add_argument('--buf', help='buffer (queue length) trace being written')
+    parser.add_argument('--interval', type=float, default=2.0, help='seconds between polls')
+    parser.add_argument('--threshold', type=float, default=1.0, help='gap (s) that starts a new batch')
+    parser.add_argument('--min-time', type=float, default=0, help='ignore drops before this time (s)')
+    parser.add_argument('--window', type=float, default=30, help='simulation seconds for the recent drop rate')
+    parser.add_argument('--max-points', type=int, default=20000, help='queue samples / batch gaps kept for the plot')
+    parser.add_argument('--idle-timeout', type=float, default=60,
+                        help='stop after this many seconds without new records (0: never)')
+    parser.add_argument('--plot', action='store_true', help='refresh a plot while following')
+    args = parser.parse_args()
+    if not args.drp and not args.buf:
+        parser.error('give --drp and/or --buf')
+
+    drops = TraceFollower(args.drp) if args.drp else None
+    buffer = TraceFollower(args.buf) if args.buf else None
+    batches = OnlineBatchStats(args.threshold, args.min_time)
+    drop_rate = DropRate(args.window)
+    queue = QueueStats(args.max_points)
+    batch_starts = deque(maxlen=args.max_points)
+    plot = setup_plot() if args.plot else None
+
+    last_activity = time.time()
+    sim_time = 0.0
+    try:
+        while True:
+            new_records = 0
+            if drops is not None:
+                records = drops.poll()
+                if records is not None and len(records):
+                    batch_starts.extend(batches.update(records[:, 0]).tolist())
+                    drop_rate.update(records[:, 0])
+                    sim_time = max(sim_time, records[-1, 0])
+                    new_records += len(records)
+            if buffer is not None:
+                records = buffer.poll()
+                if records is not None and len(records):
+                    queue.update(records[:, 0], records[:, 1])
+                    sim_time = max(sim_time, records[-1, 0])
+                    new_records += len(records)
+
+            if new_records:
+                last_activity = time.time()
+                status = (f"t={sim_time:.1f}s drops={batches.n_drops} ({drop_rate.rate():.2f}/s over {args.window:g}s) "
+                          f"batches={batches.n_batches} gap={seconds(batches.inter_gap_mean())} "
+                          f"std={seconds(np.sqrt(batches.inter_gap_var()))}")
+                if buffer is not None:
+                    status += f" queue now={queue.last_qlen} mean={queue.mean():.1f} max={queue.max_qlen}"
+                print(status)
+                if plot is not None:
+                    refresh_plot(plot, queue, batch_starts)
+            elif args.idle_timeout and time.time() - last_activity > args.idle_timeout:
+                print(f"No new records for {args.idle_timeout:g}s, stopping.")
+                break
+
+            if plot is not None:
+                plot[0].pause(args.interval)
+            else:
+                time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+
+    batches.finish()
+    summary = (f"Final: {batches.n_drops} drops in {batches.n_batches} batches, "
+               f"inter-batch gap mean {batches.inter_gap_mean():.4f}s, "
+               f"batch sizes {batches.size_histogram()}")
+    if buffer is not None:
+        summary += f", mean queue {queue.mean():.1f} packets"
+    print(summary)
+
+if __name__ == '__main__':
+    main()
@@ -1,68 +1,139 @@
+import argparse
+import glob
+import os
+
+import numpy as np
 import pandas as pd
-from scapy.all import rdpcap, TCP, IP
+
+from loss_model import LossStatistics, fit_gilbert, fit_gilbert_elliott, loss_probabilities, mark_dropped
+from pcap_reader import ip_to_int, read_pcap
+from trace_loader import load_drop_trace
+
+CHUNK_PACKETS = 1 << 20  # packets per LossStatistics update
 
 def extract_packets(pcap_file, src_ip, dst_ip):
-    packets = rdpcap(pcap_file)
-    packet_list = []
-
-    for pkt in packets:
-        if IP in pkt and TCP in pkt:
-            if pkt[IP].src == src_ip and pkt[IP].dst == dst_ip:
-                seq = pkt[TCP].seq
-                ip_id = pkt[IP].id
-                timestamp = pkt.time
-                packet_list.append({
-                    'seq': seq,
-                    'ip_id': ip_id,
-                    'timestamp': timestamp
-                })
-
-    return pd.DataFrame(packet_list)
+    src = ip_to_int(src_ip)
+    dst = ip_to_int(dst_ip)
+    packets = read_pcap(pcap_file, keep=lambda c: (c['src'] == src) & (c['dst'] == dst))
 
-def main():
-    # Define IP addresses
-    sender_ip = '10.0.1.1'   # IP of sender
-    receiver_ip = '10.0.2.2' # IP of receiver
+    return pd.DataFrame({
+        'seq': packets['seq'].astype(np.int64),
+        'ip_id': packets['ip_id'].astype(np.int64),
+        'timestamp': packets['time'],
+    })
 
+def mark_sender_drops(pcap_file, drp_file, sender_ip, receiver_ip):
     # Extract packets sent from sender to receiver
-    sender_packets = extract_packets('RED-bw1Mb-dlay100-b45p.pcap', sender_ip, receiver_ip)
+    sender_packets = extract_packets(pcap_file, sender_ip, receiver_ip)
 
     # Read packet_drop file
-    drop_df = pd.read_csv('RED-bw1Mb-dlay100-b45p-drp.tr', sep='\t', header=None, names=['time','seq'])
-    # Get drop counts for each sequence number
-    drop_counts = drop_df['seq'].value_counts().to_dict()
+    drop_df = load_drop_trace(drp_file)
 
     # Sort sender_packets by timestamp
-    sender_packets = sender_packets.sort_values('timestamp').reset_index(drop=True)
-    sender_packets['dropped'] = False
-
-    # Copy drop_counts to avoid modifying the original
-    current_drop_counts = drop_counts.copy()
-
-    # Process packets to mark drops
-    for idx, row in sender_packets.iterrows():
-        seq = row['seq']
-        if seq in current_drop_counts and current_drop_counts[seq] > 0:
-            # Mark packet as dropped
-            sender_packets.at[idx, 'dropped'] = True
-            # Decrement drop count for this sequence number
-            current_drop_counts[seq] -= 1
-
-    # Calculate unconditional probability of drop
-    P_uncond = sender_packets['dropped'].mean()
-
-    # Calculate conditional probability of drop given previous packet was dropped
-    sender_packets['prev_dropped'] = sender_packets['dropped'].shift(1).fillna(False)
-    both_dropped = sender_packets['dropped'] & sender_packets['prev_dropped']
-    N_prev_dropped = sender_packets['prev_dropped'].sum()
-    N_both_dropped = both_dropped.sum()
-    if N_prev_dropped > 0:
-        P_cond = N_both_dropped / N_prev_dropped
-    else:
-        P_cond = 0
-
-    print(f"Unconditional probability: {P_uncond:.4f}")
-    print(f"Conditional probability: {P_cond:.4f}")
+    sender_packets = sender_packets.sort_values('timestamp', kind='stable').reset_index(drop=True)
+
+    # A seq dropped k times marks its first k transmissions as dropped
+    sender_packets['dropped'] = mark_dropped(sender_packets['seq'].to_numpy(), drop_df['seq'].to_numpy())
+    return sender_packets
+
+def loss_statistics(dropped, order):
+    # Feed the bitmask to the streaming counters in fixed-size chunks
+    stats = LossStatistics(order)
+    for start in range(0, len(dropped), CHUNK_PACKETS):
+        stats.update(dropped[start:start + CHUNK_PACKETS])
+    return stats
+
+def summarize_run(dropped, stats):
+    # Unconditional probability of drop, and conditional probability of drop given previous packet was dropped
+    P_uncond, P_cond = loss_probabilities(dropped)
+    loss_runs, good_runs = stats.run_length_histograms()
+    lengths = np.arange(len(loss_runs))
+    gilbert = fit_gilbert(stats)
+    gilbert_elliott = fit_gilbert_elliott(stats)
+
+    row = {
+        'packets': stats.n_packets,
+        'drops': stats.n_drops,
+        'p_uncond': P_uncond,
+        'p_cond': P_cond,
+        'loss_runs': int(loss_runs.sum()),
+        'mean_loss_run': (lengths * loss_runs).sum() / loss_runs.sum() if loss_runs.sum() else np.nan,
+        'max_loss_run': int(np.flatnonzero(loss_runs)[-1]) if loss_runs.sum() else 0,
+        'gilbert_p': gilbert['p'],
+        'gilbert_r': gilbert['r'],
+        'ge_p': gilbert_elliott['p'],
+        'ge_r': gilbert_elliott['r'],
+        'ge_loss_good': gilbert_elliott['loss_good'],
+        'ge_loss_bad': gilbert_elliott['loss_bad'],
+    }
+    for k in range(1, stats.order + 1):
+        row[f'p_drop_after_{k}_losses'] = stats.p_drop_after_losses(k)
+    return row
+
+def find_runs(directory, pcap_suffix=None):
+    # Pair every *-drp.tr with the capture of the same run: base + pcap_suffix
+    # when given (e.g. '-0-0.pcap' for the bottleneck device), otherwise the only
+    # base.pcap or base-<node>-<dev>.pcap. Runs with several captures and no
+    # pcap_suffix are skipped, any of them could be the wrong link.
+    for drp_file in sorted(glob.glob(os.path.join(directory, '*-drp.tr'))):
+        base = drp_file[:-len('-drp.tr')]
+        if pcap_suffix is not None:
+            pcap_files = [base + pcap_suffix] if os.path.exists(base + pcap_suffix) else []
+        else:
+            pattern = glob.escape(base)
+            pcap_files = sorted(glob.glob(pattern + '.pcap') + glob.glob(pattern + '-*.pcap'))
+        if len(pcap_files) > 1:
+            print(f"Skipping {os.path.basename(base)}: several captures "
+                  f"({', '.join(os.path.basename(path) for path in pcap_files)}), choose one with --pcap-suffix")
+        elif pcap_files:
+            yield os.path.basename(base), pcap_files[0], drp_file
+
+def analyse_sweep(args):
+    rows = []
+    for run, pcap_file, drp_file in find_runs(args.sweep, args.pcap_suffix):
+        try:
+            dropped = mark_sender_drops(pcap_file, drp_file, args.sender_ip, args.receiver_ip)['dropped'].to_numpy()
+        except Exception as e:
+            print(f"Error reading {run}: {e}")
+            continue
+        row = {'run': run}
+        row.update(summarize_run(dropped, loss_statistics(dropped, args.order)))
+        rows.append(row)
+        print(f"{run}: P(drop)={row['p_uncond']:.4f} P(drop|drop)={row['p_cond']:.4f}")
+
+    pd.DataFrame(rows).to_csv(args.output, index=False)
+    print(f"Wrote {len(rows)} runs to {args.output}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Conditional and unconditional loss statistics and loss model fits')
+    parser.add_argument('--pcap', default='RED-bw1Mb-dlay100-b45p.pcap', help='capture of a single run')
+    parser.add_argument('--drp', default='RED-bw1Mb-dlay100-b45p-drp.tr', help='drop trace of the same run')
+    parser.add_argument('--sweep', help='directory: analyse every *-drp.tr that has a matching *.pcap')
+    parser.add_argument('--pcap-suffix',
+                        help="capture of every run in --sweep mode, appended to the run name (e.g. --pcap-suffix=-0-0.pcap)")
+    parser.add_argument('--output', default='loss-models.csv', help='CSV written in --sweep mode, one row per run')
+    parser.add_argument('--order', type=int, default=8, help='longest history k for P(drop | last k outcomes)')
+    parser.add_argument('--sender-ip', default='10.0.1.1', help='IP of sender')
+    parser.add_argument('--receiver-ip', default='10.0.2.2', help='IP of receiver')
+    args = parser.parse_args()
+
+    if args.sweep:
+        analyse_sweep(args)
+        return
+
+    sender_packets = mark_sender_drops(args.pcap, args.drp, args.sender_ip, args.receiver_ip)
+    dropped = sender_packets['dropped'].to_numpy()
+    stats = loss_statistics(dropped, args.order)
+    row = summarize_run(dropped, stats)
+
+    print(f"Unconditional probability: {row['p_uncond']:.4f}")
+    print(f"Conditional probability: {row['p_cond']:.4f}")
+    print(f"Loss runs: {row['loss_runs']}, mean length {row['mean_loss_run']:.2f}, longest {row['max_loss_run']}")
+    print(f"Gilbert: p={row['gilbert_p']:.4f} r={row['gilbert_r']:.4f}")
+    print(f"Gilbert-Elliott: p={row['ge_p']:.4f} r={row['ge_r']:.4f} "
+          f"loss_good={row['ge_loss_good']:.4f} loss_bad={row['ge_loss_bad']:.4f}")
+    print("P(drop | last k outcomes), history oldest first:")
+    print(stats.conditional_table().to_string(index=False))
 
     # Optionally, save dropped packets to a CSV file
     # dropped_packets = sender_packets[sender_packets['dropped']]
@@ -1,12 +1,13 @@
-import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 
+from trace_loader import load_drop_trace
+
 # This program plots a histogram of the time gaps between consecutive drops for a given flow.
 
 def process_data(drp_file, dest_port):
     # Read the drp.tr file
-    df = pd.read_csv(drp_file, sep='\t', header=None, names=['timestamp', 'seq', 'dest_port'])
+    df = load_drop_trace(drp_file)
     
     # Filter for the given dest_port
     df = df[df['dest_port'] == dest_port]
@@ -0,0 +1,209 @@
+import numpy as np
+import pandas as pd
+
+# Loss model helpers working on the per-packet dropped bitmask.
+# A sender packet is marked dropped by matching it against the drop trace:
+# if seq shows up k times in the drop trace, the first k transmissions of seq
+# (in time order) are the dropped ones.
+# On top of the bitmask: loss/good run lengths, P(drop | last k outcomes) and
+# fitted Gilbert and Gilbert-Elliott parameters (LossStatistics).
+
+
+def occurrence_rank(values):
+    # 0 for the first occurrence of every value, 1 for the second, ...
+    values = np.asarray(values)
+    order = np.argsort(values, kind='stable')
+    sorted_values = values[order]
+    group_start = np.ones(len(values), dtype=bool)
+    group_start[1:] = sorted_values[1:] != sorted_values[:-1]
+    start_index = np.maximum.accumulate(np.where(group_start, np.arange(len(values)), 0))
+    rank = np.empty(len(values), dtype=np.int64)
+    rank[order] = np.arange(len(values)) - start_index
+    return rank
+
+
+def mark_dropped(seqs, drop_seqs):
+    # seqs: sender packets in transmission order, drop_seqs: seq column of the drop trace
+    seqs = np.asarray(seqs)
+    drop_values, drop_counts = np.unique(np.asarray(drop_seqs), return_counts=True)
+    if len(drop_values) == 0:
+        return np.zeros(len(seqs), dtype=bool)
+
+    index = np.minimum(np.searchsorted(drop_values, seqs), len(drop_values) - 1)
+    counts = np.where(drop_values[index] == seqs, drop_counts[index], 0)
+    return occurrence_rank(seqs) < counts
+
+
+def loss_probabilities(dropped):
+    # Unconditional P(drop) and P(drop | previous packet dropped)
+    dropped = np.asarray(dropped, dtype=bool)
+    if len(dropped) == 0:
+        return np.nan, 0
+    p_uncond = dropped.mean()
+    n_prev_dropped = dropped[:-1].sum()
+    n_both_dropped = (dropped[1:] & dropped[:-1]).sum()
+    p_cond = n_both_dropped / n_prev_dropped if n_prev_dropped > 0 else 0
+    return p_uncond, p_cond
+
+
+def run_lengths(dropped):
+    # (values, lengths) of the runs of equal outcomes in the bitmask
+    dropped = np.asarray(dropped, dtype=bool)
+    if len(dropped) == 0:
+        return np.array([], dtype=bool), np.array([], dtype=np.int64)
+    starts = np.concatenate(([0], np.flatnonzero(dropped[1:] != dropped[:-1]) + 1))
+    lengths = np.diff(np.append(starts, len(dropped)))
+    return dropped[starts], lengths
+
+
+def _add_histogram(histogram, lengths):
+    counts = np.bincount(lengths)
+    if len(counts) > len(histogram):
+        histogram = np.pad(histogram, (0, len(counts) - len(histogram)))
+    histogram[:len(counts)] += counts
+    return histogram
+
+
+class LossStatistics:
+    # Streaming statistics over the dropped bitmask, fed chunk by chunk with update().
+    # Every packet with `order` packets before it is counted under its bit-packed
+    # (order + 1)-bit pattern: bit 0 is the packet itself, bit j the packet j
+    # positions earlier. All conditional probabilities up to `order` and the model
+    # fits are derived from this 2^(order+1) histogram, plus loss/good run-length
+    # histograms. Memory does not depend on the trace length.
+
+    def __init__(self, order=8):
+        self.order = order
+        self.patterns = np.zeros(2 ** (order + 1), dtype=np.int64)
+        self.history = np.zeros(0, dtype=np.int64)  # last `order` outcomes
+        self.loss_runs = np.zeros(1, dtype=np.int64)  # index = run length
+        self.good_runs = np.zeros(1, dtype=np.int64)
+        self.run_value = None  # run still open at the end of the last chunk
+        self.run_length = 0
+        self.n_packets = 0
+        self.n_drops = 0
+
+    def update(self, dropped):
+        dropped = np.asarray(dropped, dtype=bool)
+        if len(dropped) == 0:
+            return
+        self.n_packets += len(dropped)
+        self.n_drops += int(dropped.sum())
+        self._count_patterns(dropped)
+        self._count_runs(dropped)
+
+    def _count_patterns(self, dropped):
+        order = self.order
+        full = np.concatenate((self.history, dropped.astype(np.int64)))
+        if len(full) > order:
+            pattern = full[order:].copy()
+            for j in range(1, order + 1):
+                pattern |= full[order - j:len(full) - j] << j
+            self.patterns += np.bincount(pattern, minlength=len(self.patterns))
+        self.history = full[-order:] if order > 0 else full[:0]
+
+    def _count_runs(self, dropped):
+        values, lengths = run_lengths(dropped)
+        if self.run_value is not None:
+            if values[0] == self.run_value:
+                lengths[0] += self.run_length
+            else:
+                self._add_runs(np.array([self.run_value]), np.array([self.run_length]))
+        self._add_runs(values[:-1], lengths[:-1])
+        self.run_value, self.run_length = bool(values[-1]), int(lengths[-1])
+
+    def _add_runs(self, values, lengths):
+        self.loss_runs = _add_histogram(self.loss_runs, lengths[values])
+        self.good_runs = _add_histogram(self.good_runs, lengths[~values])
+
+    def run_length_histograms(self):
+        # (loss_runs, good_runs) histograms, including the run still open
+        loss_runs, good_runs = self.loss_runs.copy(), self.good_runs.copy()
+        if self.run_value is not None:
+            if self.run_value:
+                loss_runs = _add_histogram(loss_runs, np.array([self.run_length]))
+            else:
+                good_runs = _add_histogram(good_runs, np.array([self.run_length]))
+        return loss_runs, good_runs
+
+    def history_counts(self, k):
+        # (packets, drops) per history of the last k outcomes, history bit 0 = previous packet
+        index = np.arange(len(self.patterns))
+        history = (index >> 1) & ((1 << k) - 1)
+        packets = np.bincount(history, weights=self.patterns, minlength=2 ** k)
+        drops = np.bincount(history, weights=self.patterns * (index & 1), minlength=2 ** k)
+        return packets, drops
+
+    def conditional_table(self, max_order=None):
+        # P(drop | last k outcomes) for k = 1..max_order; history is written oldest first
+        rows = []
+        for k in range(1, (max_order or self.order) + 1):
+            packets, drops = self.history_counts(k)
+            for h in range(2 ** k):
+                rows.append({
+                    'k': k,
+                    'history': format(h, f'0{k}b'),
+                    'packets': int(packets[h]),
+                    'p_drop': drops[h] / packets[h] if packets[h] > 0 else np.nan,
+                })
+        return pd.DataFrame(rows)
+
+    def p_drop_after_losses(self, k):
+        # P(drop | the last k packets were all dropped)
+        packets, drops = self.history_counts(k)
+        last = 2 ** k - 1
+        return drops[last] / packets[last] if packets[last] > 0 else np.nan
+
+
+def fit_gilbert(stats):
+    # Simple Gilbert model: every packet in Bad is lost, none in Good.
+    # p = P(Good -> Bad) = P(drop | previous kept), r = P(Bad -> Good) = P(kept | previous dropped)
+    packets, drops = stats.history_counts(1)
+    p = drops[0] / packets[0] if packets[0] > 0 else np.nan
+    r = 1 - drops[1] / packets[1] if packets[1] > 0 else np.nan
+    return {'p': p, 'r': r}
+
+
+def pattern_probabilities(p, r, loss_good, loss_bad, length):
+    # Stationary probability of every `length`-bit outcome pattern (bit 0 newest)
+    # under a Gilbert-Elliott chain, via the forward recursion over all patterns at once
+    bits = (np.arange(2 ** length)[:, None] >> np.arange(length - 1, -1, -1)) & 1  # oldest first
+    transition = np.array([[1 - p, p], [r, 1 - r]])
+    loss = np.array([loss_good, loss_bad])
+
+    def emission(outcome):
+        return np.where(outcome[:, None] == 1, loss, 1 - loss)
+
+    alpha = np.array([r, p]) / (p + r) * emission(bits[:, 0])
+    for column in range(1, length):
+        alpha = (alpha @ transition) * emission(bits[:, column])
+    return alpha.sum(axis=1)
+
+
+def fit_gilbert_elliott(stats):
+    # Gilbert-Elliott model: loss probability loss_good in Good and loss_bad in Bad.
+    # Fitted by maximising the composite likelihood of the (order + 1)-bit pattern
+    # histogram, starting from the simple Gilbert fit.
+    from scipy.optimize import minimize
+    from scipy.special import expit, logit
+
+    nan_fit = {'p': np.nan, 'r': np.nan, 'loss_good': np.nan, 'loss_bad': np.nan}
+    if stats.n_drops == 0 or stats.patterns.sum() == 0:
+        return nan_fit
+
+    gilbert = fit_gilbert(stats)
+    eps = 1e-3
+    start = np.clip([gilbert['p'], gilbert['r'], eps, 1 - eps], eps, 1 - eps)
+    length = stats.order + 1
+    counts = stats.patterns
+
+    def negative_log_likelihood(x):
+        probabilities = pattern_probabilities(*expit(x), length)
+        return -np.sum(counts * np.log(np.maximum(probabilities, 1e-300)))
+
+    result = minimize(negative_log_likelihood, logit(start), method='L-BFGS-B')
+    p, r, loss_good, loss_bad = expit(result.x)
+    if loss_good > loss_bad:
+        # Name the lossier state Bad
+        p, r, loss_good, loss_bad = r, p, loss_bad, loss_good
+    return {'p': p, 'r': r, 'loss_good': loss_good, 'loss_bad': loss_bad}
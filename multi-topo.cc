@@ -41,7 +41,10 @@
 #include "ns3/config-store-module.h" 
 #include <fstream>
 #include <iostream>
+#include <sstream>
 #include <string>
+#include <utility>
+#include <vector>
 #include <ns3/packet-metadata.h>
 
 using namespace ns3;
@@ -49,16 +52,178 @@ using namespace ns3;
 NS_LOG_COMPONENT_DEFINE("CoDel-Droptail-RED-BasicTest");
 
 /**
- * Function called when Congestion Window is changed.
+ * Buffers trace records in memory and writes them to the trace file in blocks.
+ *
+ * With a buffer size of 0 every record is flushed as soon as it is complete,
+ * like the std::endl the tracers used before. Otherwise records are written
+ * once the buffer holds at least bufferSize bytes, and the rest when
+ * FlushTraceWriters is called after the simulation. The file content is the same.
+ */
+class TraceWriter : public SimpleRefCount<TraceWriter>
+{
+  public:
+    TraceWriter(Ptr<OutputStreamWrapper> stream, uint32_t bufferSize)
+        : m_stream(stream),
+          m_bufferSize(bufferSize),
+          m_bytesWritten(0)
+    {
+    }
+
+    /**
+     * \return the stream the current record is formatted into.
+     */
+    std::ostream& Record()
+    {
+        return m_buffer;
+    }
+
+    /**
+     * Mark the end of a record, flushing the buffer if it is full.
+     */
+    void EndRecord()
+    {
+        if (static_cast<uint64_t>(m_buffer.tellp()) >= m_bufferSize)
+        {
+            Flush();
+        }
+    }
+
+    /**
+     * Write the buffered records to the file.
+     */
+    void Flush()
+    {
+        const std::string data = m_buffer.str();
+        if (!data.empty())
+        {
+            m_stream->GetStream()->write(data.data(), data.size());
+            m_bytesWritten += data.size();
+            m_buffer.str(std::string());
+        }
+        m_stream->GetStream()->flush();
+    }
+
+    /**
+     * \return the number of bytes written to the file so far.
+     */
+    uint64_t GetBytesWritten() const
+    {
+        return m_bytesWritten;
+    }
+
+  private:
+    Ptr<OutputStreamWrapper> m_stream; //!< Trace file
+    std::ostringstream m_buffer;       //!< Records not written yet
+    uint32_t m_bufferSize;             //!< Flush threshold in bytes
+    uint64_t m_bytesWritten;           //!< Bytes written to the file
+};
+
+static std::vector<Ptr<TraceWriter>> g_traceWriters; //!< Writers of all open traces
+
+/**
+ * Create a trace writer and register it for the final flush.
  *
  * \param stream Output stream.
+ * \param bufferSize Flush threshold in bytes, 0 to flush every record.
+ * \return the writer.
+ */
+static Ptr<TraceWriter>
+CreateTraceWriter(Ptr<OutputStreamWrapper> stream, uint32_t bufferSize)
+{
+    Ptr<TraceWriter> writer = Create<TraceWriter>(stream, bufferSize);
+    g_traceWriters.push_back(writer);
+    return writer;
+}
+
+/**
+ * Flush every trace writer, to be called once Simulator::Run returns.
+ *
+ * \return the total number of trace bytes written.
+ */
+static uint64_t
+FlushTraceWriters()
+{
+    uint64_t bytesWritten = 0;
+    for (const auto& writer : g_traceWriters)
+    {
+        writer->Flush();
+        bytesWritten += writer->GetBytesWritten();
+    }
+    return bytesWritten;
+}
+
+/**
+ * Write the header of a binary trace file.
+ *
+ * Layout: "NS3TRACE", version (1 byte), column count (1 byte), 6 reserved bytes,
+ * then 16 bytes of column name and 4 bytes of NumPy dtype (e.g. "<f8") per column.
+ * Fixed-width records with the packed column values follow the header.
+ *
+ * \param writer Writer of a stream opened in binary mode.
+ * \param columns (name, dtype without byte order) of every column.
+ */
+static void
+WriteBinaryTraceHeader(Ptr<TraceWriter> writer,
+                       const std::vector<std::pair<std::string, std::string>>& columns)
+{
+    const uint16_t one = 1;
+    const char byteOrder = (*reinterpret_cast<const char*>(&one) == 1) ? '<' : '>';
+
+    std::ostream& os = writer->Record();
+    char preamble[16] = {'N', 'S', '3', 'T', 'R', 'A', 'C', 'E', 1, static_cast<char>(columns.size())};
+    os.write(preamble, sizeof(preamble));
+    for (const auto& column : columns)
+    {
+        char name[16] = {};
+        char dtype[4] = {};
+        column.first.copy(name, sizeof(name) - 1);
+        (byteOrder + column.second).copy(dtype, sizeof(dtype));
+        os.write(name, sizeof(name));
+        os.write(dtype, sizeof(dtype));
+    }
+    writer->EndRecord();
+}
+
+/**
+ * Append one field of a binary trace record.
+ *
+ * \param writer Trace writer.
+ * \param value Field value, written in host byte order.
+ */
+template <typename T>
+static void
+WriteBinaryField(Ptr<TraceWriter> writer, T value)
+{
+    writer->Record().write(reinterpret_cast<const char*>(&value), sizeof(value));
+}
+
+/**
+ * Function called when Congestion Window is changed.
+ *
+ * \param writer Trace writer.
  * \param oldval Old value.
  * \param newval New value.
  */
 static void
-CwndTracer(Ptr<OutputStreamWrapper> stream, uint32_t oldval, uint32_t newval)
+CwndTracer(Ptr<TraceWriter> writer, uint32_t oldval, uint32_t newval)
 {
-    *stream->GetStream() << Simulator::Now().GetSeconds()<< "\t" << newval << std::endl;
+    writer->Record() << Simulator::Now().GetSeconds()<< "\t" << newval << "\n";
+    writer->EndRecord();
+}
+
+/**
+ * Binary version of CwndTracer: one (f8 timestamp, u4 cwnd) record.
+ *
+ * \param writer Trace writer.
+ * \param oldval Old value.
+ * \param newval New value.
+ */
+static void
+CwndTracerBinary(Ptr<TraceWriter> writer, uint32_t oldval, uint32_t newval)
+{
+    WriteBinaryField(writer, Simulator::Now().GetSeconds());
+    WriteBinaryField(writer, newval);
+    writer->EndRecord();
 }
 
 /**
@@ -73,14 +238,14 @@ CwndTracer(Ptr<OutputStreamWrapper> stream, uint32_t oldval, uint32_t newval)
 /**
  * Function called when Congestion Window is changed.
  *
- * \param stream Output stream.
+ * \param writer Trace writer.
  * \param oldval Old value.
  * \param newval New value.
  */
 
 
 static void
-TraceCwnd(std::string cwndTrFileName)
+TraceCwnd(std::string cwndTrFileName, bool binaryTrace, uint32_t traceBufferSize)
 {
     AsciiTraceHelper ascii;
     if (cwndTrFileName.empty())
@@ -90,17 +255,37 @@ TraceCwnd(std::string cwndTrFileName)
     }
     else
     {
+        if (binaryTrace)
+        {
+            Ptr<OutputStreamWrapper> stream =
+                ascii.CreateFileStream(cwndTrFileName, std::ios::out | std::ios::binary);
+            Ptr<TraceWriter> writer = CreateTraceWriter(stream, traceBufferSize);
+            WriteBinaryTraceHeader(writer, {{"timestamp", "f8"}, {"cwnd", "u4"}});
+            Config::ConnectWithoutContext(
+                "/NodeList/1/$ns3::TcpL4Protocol/SocketList/0/CongestionWindow",
+                MakeBoundCallback(&CwndTracerBinary, writer));
+            return;
+        }
         Ptr<OutputStreamWrapper> stream = ascii.CreateFileStream(cwndTrFileName);
         Config::ConnectWithoutContext(
             "/NodeList/1/$ns3::TcpL4Protocol/SocketList/0/CongestionWindow",
-            MakeBoundCallback(&CwndTracer, stream));
+            MakeBoundCallback(&CwndTracer, CreateTraceWriter(stream, traceBufferSize)));
     }
 }
 
 static void
-BufTracerfifo(Ptr<OutputStreamWrapper> stream, uint32_t oldval, uint32_t newval)
+BufTracerfifo(Ptr<TraceWriter> writer, uint32_t oldval, uint32_t newval)
+{
+    writer->Record() << Simulator::Now().GetSeconds()<< "\t"<< newval << "\n";
+    writer->EndRecord();
+}
+
+static void
+BufTracerfifoBinary(Ptr<TraceWriter> writer, uint32_t oldval, uint32_t newval)
 {
-    *stream->GetStream() << Simulator::Now().GetSeconds()<< "\t"<< newval << std::endl;
+    WriteBinaryField(writer, Simulator::Now().GetSeconds());
+    WriteBinaryField(writer, newval);
+    writer->EndRecord();
 }
 
 /**
@@ -113,13 +298,27 @@ BufTracerfifo(Ptr<OutputStreamWrapper> stream, uint32_t oldval, uint32_t newval)
 
 
 static void
-DropTracer(Ptr<OutputStreamWrapper> stream, Ptr<const QueueDiscItem> item)
+DropTracer(Ptr<TraceWriter> writer, Ptr<const QueueDiscItem> item)
 {   
     Ptr<Packet> packetCopy = item->GetPacket()->Copy();
 
     TcpHeader tcpHeader;
     packetCopy->RemoveHeader(tcpHeader);
-    *stream->GetStream() <<Simulator::Now().GetSeconds()<< "\t" << tcpHeader.GetSequenceNumber().GetValue() <<"\t"<<tcpHeader.GetDestinationPort() << std::endl;
+    writer->Record() <<Simulator::Now().GetSeconds()<< "\t" << tcpHeader.GetSequenceNumber().GetValue() <<"\t"<<tcpHeader.GetDestinationPort() << "\n";
+    writer->EndRecord();
+}
+
+static void
+DropTracerBinary(Ptr<TraceWriter> writer, Ptr<const QueueDiscItem> item)
+{
+    Ptr<Packet> packetCopy = item->GetPacket()->Copy();
+
+    TcpHeader tcpHeader;
+    packetCopy->RemoveHeader(tcpHeader);
+    WriteBinaryField(writer, Simulator::Now().GetSeconds());
+    WriteBinaryField(writer, tcpHeader.GetSequenceNumber().GetValue());
+    WriteBinaryField(writer, tcpHeader.GetDestinationPort());
+    writer->EndRecord();
 }
 
 /**
@@ -132,7 +331,7 @@ DropTracer(Ptr<OutputStreamWrapper> stream, Ptr<const QueueDiscItem> item)
 
 
 static void
-TraceBuffifo(std::string bufTrFileName)
+TraceBuffifo(std::string bufTrFileName, bool binaryTrace, uint32_t traceBufferSize)
 {
     AsciiTraceHelper ascii;
     if (bufTrFileName.empty())
@@ -142,15 +341,26 @@ TraceBuffifo(std::string bufTrFileName)
     }
     else
     {
+        if (binaryTrace)
+        {
+            Ptr<OutputStreamWrapper> stream =
+                ascii.CreateFileStream(bufTrFileName, std::ios::out | std::ios::binary);
+            Ptr<TraceWriter> writer = CreateTraceWriter(stream, traceBufferSize);
+            WriteBinaryTraceHeader(writer, {{"timestamp", "f8"}, {"qlen", "u4"}});
+            Config::ConnectWithoutContext(
+                "/NodeList/0/$ns3::Node/$ns3::TrafficControlLayer/RootQueueDiscList/4/PacketsInQueue",
+                MakeBoundCallback(&BufTracerfifoBinary, writer));
+            return;
+        }
         Ptr<OutputStreamWrapper> stream = ascii.CreateFileStream(bufTrFileName);
         Config::ConnectWithoutContext(
             "/NodeList/0/$ns3::Node/$ns3::TrafficControlLayer/RootQueueDiscList/4/PacketsInQueue",
-            MakeBoundCallback(&BufTracerfifo, stream));
+            MakeBoundCallback(&BufTracerfifo, CreateTraceWriter(stream, traceBufferSize)));
     }
 }
 
 static void
-TraceDrop(std::string dropTrFileName)
+TraceDrop(std::string dropTrFileName, bool binaryTrace, uint32_t traceBufferSize)
 {
     AsciiTraceHelper ascii;
     if (dropTrFileName.empty())
@@ -160,10 +370,21 @@ TraceDrop(std::string dropTrFileName)
     }
     else
     {
+        if (binaryTrace)
+        {
+            Ptr<OutputStreamWrapper> stream =
+                ascii.CreateFileStream(dropTrFileName, std::ios::out | std::ios::binary);
+            Ptr<TraceWriter> writer = CreateTraceWriter(stream, traceBufferSize);
+            WriteBinaryTraceHeader(writer, {{"timestamp", "f8"}, {"seq", "u4"}, {"dest_port", "u2"}});
+            Config::ConnectWithoutContext(
+                "/NodeList/0/$ns3::Node/$ns3::TrafficControlLayer/RootQueueDiscList/4/Drop",
+                MakeBoundCallback(&DropTracerBinary, writer));
+            return;
+        }
         Ptr<OutputStreamWrapper> stream = ascii.CreateFileStream(dropTrFileName);
         Config::ConnectWithoutContext(
             "/NodeList/0/$ns3::Node/$ns3::TrafficControlLayer/RootQueueDiscList/4/Drop",
-            MakeBoundCallback(&DropTracer, stream));
+            MakeBoundCallback(&DropTracer, CreateTraceWriter(stream, traceBufferSize)));
     }
 }
 
@@ -194,6 +415,8 @@ main(int argc, char* argv[])
     std::string cwndTrFileName = "CD-multiflow-cwn.tr";
     std::string bufTrFileName = "CD-multiflow-buf.tr";
     std::string dropTrFileName = "CD-multiflow-drp.tr";
+    bool binaryTrace = false;
+    uint32_t traceBufferSize = 0;               // in bytes, 0 flushes every record
     bool logging = false;
 
     CommandLine cmd(__FILE__);
@@ -213,6 +436,8 @@ main(int argc, char* argv[])
     cmd.AddValue("cwndTrFileName", "Name of cwnd trace file", cwndTrFileName);
     cmd.AddValue("bufTrFileName", "Name of queue length (in unit of packets) trace file", bufTrFileName);
     cmd.AddValue("dropTrFileName", "Name of drop trace file", dropTrFileName);
+    cmd.AddValue("binaryTrace", "Write cwnd/buf/drop traces as fixed-width binary records", binaryTrace);
+    cmd.AddValue("traceBufferSize", "Bytes of trace records buffered before writing (0 flushes every record)", traceBufferSize);
 
     cmd.AddValue("logging", "Flag to enable/disable logging", logging);
 
@@ -422,11 +647,11 @@ main(int argc, char* argv[])
     // sinkApp.Start(Seconds(0));
     // sinkApp.Stop(Seconds(stopTime));
 
-    Simulator::Schedule(Seconds(0.00001), &TraceCwnd, cwndTrFileName);
+    Simulator::Schedule(Seconds(0.00001), &TraceCwnd, cwndTrFileName, binaryTrace, traceBufferSize);
     
-    Simulator::Schedule(Seconds(0.00001), &TraceBuffifo, bufTrFileName);
+    Simulator::Schedule(Seconds(0.00001), &TraceBuffifo, bufTrFileName, binaryTrace, traceBufferSize);
 
-    Simulator::Schedule(Seconds(0.00001), &TraceDrop, dropTrFileName);
+    Simulator::Schedule(Seconds(0.00001), &TraceDrop, dropTrFileName, binaryTrace, traceBufferSize);
     
 
     if (isPcapEnabled)
@@ -451,6 +676,9 @@ main(int argc, char* argv[])
 
     Simulator::Run();
 
+    std::cout << "Trace bytes written: " << FlushTraceWriters() << std::endl;
+    g_traceWriters.clear();
+
     Simulator::Destroy();
     return 0;
 }
@@ -0,0 +1,44 @@
+import argparse
+
+import numpy as np
+
+from batching import OnlineBatchStats
+from trace_loader import CHUNK_ROWS, iter_drop_chunks
+
+# Batch statistics of a drop trace of any length, read in chunks with constant memory.
+# The trace can be a file, '-' for stdin, or a FIFO the simulation writes to:
+#   mkfifo drops.fifo
+#   ./ns3 run "scratch/lost-topo.cc --dropTrFileName=drops.fifo" &
+#   python online-batches.py drops.fifo --progress
+# Drops must arrive in time order, which is how ns-3 writes them.
+
+def print_stats(stats, label):
+    print(f"{label}: {stats.n_drops} drops, {stats.n_batches} batches, "
+          f"inter-batch gap mean {stats.inter_gap_mean():.4f}s std {np.sqrt(stats.inter_gap_var()):.4f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description='Streaming batch statistics of a drop trace')
+    parser.add_argument('source', nargs='?', default='-', help="drop trace file, FIFO or '-' for stdin")
+    parser.add_argument('--threshold', type=float, default=1.0, help='gap (s) that starts a new batch')
+    parser.add_argument('--min-time', type=float, default=20, help='ignore drops before this time (s)')
+    parser.add_argument('--dest-port', type=int, help='only drops of this flow (3 column traces)')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help='drop records read at a time')
+    parser.add_argument('--progress', action='store_true', help='print the running statistics after every chunk')
+    args = parser.parse_args()
+
+    stats = OnlineBatchStats(args.threshold, args.min_time)
+    for chunk in iter_drop_chunks(args.source, args.chunk_rows):
+        if args.dest_port is not None:
+            chunk = chunk[chunk['dest_port'] == args.dest_port]
+        stats.update(chunk['timestamp'].to_numpy())
+        if args.progress:
+            print_stats(stats, f"t={chunk['timestamp'].iloc[-1]:.2f}s" if len(chunk) else 'chunk')
+    stats.finish()
+
+    print_stats(stats, 'Total')
+    print("Batch size histogram:", stats.size_histogram())
+    print("Modal batch size:", stats.modal_batch_size())
+    print("Average within-batch time differences:", stats.avg_within_batch_diffs())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+import socket
+import struct
+
+import numpy as np
+
+# Lightweight pcap reader used instead of scapy's rdpcap.
+# The capture is read in chunks and only the fields the analysis uses are
+# decoded, straight into NumPy columns:
+#   time, src, dst (IPv4 as uint32), ip_id, sport, dport, seq, ack
+# Non IPv4/TCP packets are skipped. Supported link types are PPP (what the
+# ns-3 point-to-point devices write), Ethernet and raw IPv4.
+
+LINKTYPE_ETHERNET = 1
+LINKTYPE_PPP = 9
+LINKTYPE_RAW = 101
+LINKTYPE_IPV4 = 228
+
+PCAP_HEADER_LEN = 24
+RECORD_HEADER_LEN = 16
+CHUNK_BYTES = 16 << 20
+
+COLUMNS = {
+    'time': np.float64,
+    'src': np.uint32,
+    'dst': np.uint32,
+    'ip_id': np.uint16,
+    'sport': np.uint16,
+    'dport': np.uint16,
+    'seq': np.uint32,
+    'ack': np.uint32,
+}
+
+
+def ip_to_int(ip):
+    return struct.unpack('!I', socket.inet_aton(ip))[0]
+
+
+def int_to_ip(value):
+    return socket.inet_ntoa(struct.pack('!I', int(value)))
+
+
+def read_pcap_header(f):
+    header = f.read(PCAP_HEADER_LEN)
+    if len(header) < PCAP_HEADER_LEN:
+        raise ValueError("File too short for a pcap header")
+    for endian in ('<', '>'):
+        magic, = struct.unpack(endian + 'I', header[:4])
+        if magic == 0xa1b2c3d4:
+            ts_scale = 1e-6
+            break
+        if magic == 0xa1b23c4d:
+            ts_scale = 1e-9
+            break
+    else:
+        raise ValueError("Not a pcap file (pcapng is not supported)")
+    linktype, = struct.unpack(endian + 'I', header[20:24])
+    if linktype not in (LINKTYPE_ETHERNET, LINKTYPE_PPP, LINKTYPE_RAW, LINKTYPE_IPV4):
+        raise ValueError(f"Unsupported pcap link type {linktype}")
+    return endian, ts_scale, linktype
+
+
+def _u8(buf, pos):
+    return buf[pos].astype(np.uint32)
+
+
+def _be16(buf, pos):
+    return (_u8(buf, pos) << 8) | _u8(buf, pos + 1)
+
+
+def _be32(buf, pos):
+    return (_be16(buf, pos) << 16) | _be16(buf, pos + 2)
+
+
+def _u32(buf, pos, endian):
+    if endian == '>':
+        return _be32(buf, pos)
+    return (_u8(buf, pos + 3) << 24) | (_u8(buf, pos + 2) << 16) | (_u8(buf, pos + 1) << 8) | _u8(buf, pos)
+
+
+def decode_records(buf, offsets, endian, ts_scale, linktype):
+    # Decode complete records starting at offsets in buf (uint8 array) into columns
+    caplen = _u32(buf, offsets + 8, endian).astype(np.int64)
+    pkt = offsets + RECORD_HEADER_LEN
+    end = pkt + caplen
+    last = len(buf) - 1
+
+    def gather(fn, pos):
+        # Clip reads past the record, those packets are masked out below anyway
+        return fn(buf, np.minimum(pos, last))
+
+    if linktype == LINKTYPE_PPP:
+        # 2 byte protocol field, optionally preceded by address/control ff 03
+        has_ac = (gather(_u8, pkt) == 0xff) & (gather(_u8, pkt + 1) == 0x03)
+        proto_pos = pkt + np.where(has_ac, 2, 0)
+        ip = proto_pos + 2
+        keep = gather(_be16, proto_pos) == 0x0021
+    elif linktype == LINKTYPE_ETHERNET:
+        ethertype = gather(_be16, pkt + 12)
+        vlan = ethertype == 0x8100
+        ip = pkt + np.where(vlan, 18, 14)
+        keep = np.where(vlan, gather(_be16, pkt + 16), ethertype) == 0x0800
+    else:
+        ip = pkt
+        keep = np.ones(len(offsets), dtype=bool)
+
+    version_ihl = gather(_u8, ip)
+    tcp = ip + (version_ihl & 0xf).astype(np.int64) * 4
+    keep &= (version_ihl >> 4) == 4
+    keep &= gather(_u8, ip + 9) == 6                   # TCP
+    keep &= (gather(_be16, ip + 6) & 0x1fff) == 0      # first fragment only
+    keep &= tcp + 12 <= end                            # seq and ack captured
+
+    ip, tcp, offsets = ip[keep], tcp[keep], offsets[keep]
+    seconds = _u32(buf, offsets, endian).astype(np.float64)
+    fraction = _u32(buf, offsets + 4, endian).astype(np.float64)
+
+    return {
+        'time': seconds + fraction * ts_scale,
+        'src': _be32(buf, ip + 12),
+        'dst': _be32(buf, ip + 16),
+        'ip_id': _be16(buf, ip + 4).astype(np.uint16),
+        'sport': _be16(buf, tcp).astype(np.uint16),
+        'dport': _be16(buf, tcp + 2).astype(np.uint16),
+        'seq': _be32(buf, tcp + 4),
+        'ack': _be32(buf, tcp + 8),
+    }
+
+
+def iter_pcap_chunks(file_path, chunk_bytes=CHUNK_BYTES):
+    # Yield the decoded columns of the capture, one chunk of records at a time
+    with open(file_path, 'rb') as f:
+        endian, ts_scale, linktype = read_pcap_header(f)
+        caplen_format = struct.Struct(endian + 'I')
+        leftover = b''
+        while True:
+            data = f.read(chunk_bytes)
+            buf = leftover + data
+            offsets = []
+            pos = 0
+            while pos + RECORD_HEADER_LEN <= len(buf):
+                caplen, = caplen_format.unpack_from(buf, pos + 8)
+                if pos + RECORD_HEADER_LEN + caplen > len(buf):
+                    break
+                offsets.append(pos)
+                pos += RECORD_HEADER_LEN + caplen
+            leftover = buf[pos:]
+
+            if offsets:
+                yield decode_records(np.frombuffer(buf, dtype=np.uint8),
+                                     np.array(offsets, dtype=np.int64), endian, ts_scale, linktype)
+            if not data:
+                # A truncated last record (capture still being written) is ignored
+                break
+
+
+def read_pcap(file_path, keep=None):
+    # Read a whole capture into columns. keep(columns) -> bool mask can be used
+    # to drop packets chunk by chunk, so only the selected ones are held in memory.
+    chunks = []
+    for columns in iter_pcap_chunks(file_path):
+        if keep is not None:
+            mask = keep(columns)
+            columns = {name: values[mask] for name, values in columns.items()}
+        chunks.append(columns)
+    if not chunks:
+        return {name: np.array([], dtype=dtype) for name, dtype in COLUMNS.items()}
+    return {name: np.concatenate([c[name] for c in chunks]) for name in COLUMNS}
+
+
+def read_seq_ack(file_path, sender_ip, receiver_ip):
+    # Data packets sender -> receiver (time, seq) and ACKs receiver -> sender (time, ack)
+    sender = ip_to_int(sender_ip)
+    receiver = ip_to_int(receiver_ip)
+
+    def between_hosts(c):
+        return ((c['src'] == sender) & (c['dst'] == receiver)) | ((c['src'] == receiver) & (c['dst'] == sender))
+
+    packets = read_pcap(file_path, keep=between_hosts)
+    sent = packets['src'] == sender
+    acks = ~sent
+    return packets['time'][sent], packets['seq'][sent], packets['time'][acks], packets['ack'][acks]
+
+
+def demux_flows(file_paths):
+    # Read each capture once and split the TCP packets by direction
+    # (src, dst, sport, dport). Returns {(src_ip, dst_ip, sport, dport): columns},
+    # every flow sorted by time. The captures should be of different links,
+    # a packet seen in two of them would show up twice.
+    if isinstance(file_paths, str):
+        file_paths = [file_paths]
+    captures = [read_pcap(file_path) for file_path in file_paths]
+    packets = {name: np.concatenate([c[name] for c in captures]) for name in COLUMNS}
+    if len(packets['time']) == 0:
+        return {}
+
+    order = np.lexsort((packets['time'], packets['dport'], packets['sport'], packets['dst'], packets['src']))
+    packets = {name: values[order] for name, values in packets.items()}
+
+    key_changes = np.zeros(len(order), dtype=bool)
+    key_changes[0] = True
+    for name in ('src', 'dst', 'sport', 'dport'):
+        key_changes[1:] |= packets[name][1:] != packets[name][:-1]
+    starts = np.flatnonzero(key_changes)
+    ends = np.append(starts[1:], len(order))
+
+    flows = {}
+    for start, end in zip(starts, ends):
+        key = (int_to_ip(packets['src'][start]), int_to_ip(packets['dst'][start]),
+               int(packets['sport'][start]), int(packets['dport'][start]))
+        flows[key] = {name: values[start:end] for name, values in packets.items()}
+    return flows
+
+
+def flow_seq_ack(flows, sender_ip, receiver_ip, dport=None):
+    # SEQ of the data packets sender -> receiver (to dport if given) and the ACKs
+    # coming back, merged over all matching flows and sorted by time
+    sent = [f for (src, dst, sport, port), f in flows.items()
+            if src == sender_ip and dst == receiver_ip and (dport is None or port == dport)]
+    acks = [f for (src, dst, port, dport_back), f in flows.items()
+            if src == receiver_ip and dst == sender_ip and (dport is None or port == dport)]
+
+    def merge(selected, field):
+        if not selected:
+            return np.array([], dtype=np.float64), np.array([], dtype=COLUMNS[field])
+        times = np.concatenate([f['time'] for f in selected])
+        values = np.concatenate([f[field] for f in selected])
+        order = np.argsort(times, kind='stable')
+        return times[order], values[order]
+
+    sent_times, sent_seqs = merge(sent, 'seq')
+    ack_times, ack_acks = merge(acks, 'ack')
+    return sent_times, sent_seqs, ack_times, ack_acks
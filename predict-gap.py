@@ -0,0 +1,60 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from gap_models import GapPredictor
+
+# Predicted inter-batch gap and drops per batch at points that were not
+# simulated, from the models saved by function_estimate.py.
+#   python predict-gap.py --bandwidth 1.25 2.5 7.75 --delay 50 100
+#   python predict-gap.py --input points.csv --output predictions.csv
+# The points are the bandwidth x delay grid of the given values, or the rows of
+# a CSV with bandwidth, delay and optionally buffer columns.
+
+def parse_values(values):
+    # Numbers, or start:stop:step ranges (stop included)
+    result = []
+    for value in values:
+        if ':' in value:
+            start, stop, step = (float(v) for v in value.split(':'))
+            result.extend(np.arange(start, stop + step / 2, step))
+        else:
+            result.append(float(value))
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='Predict batch statistics without running the simulation')
+    parser.add_argument('--model', default='gap-model.json', help='models saved by function_estimate.py')
+    parser.add_argument('--bandwidth', nargs='+', default=[], help='bandwidths (Mbps) or start:stop:step')
+    parser.add_argument('--delay', nargs='+', default=[], help='delays (ms) or start:stop:step')
+    parser.add_argument('--buffer', type=float, help='buffer size (packets), default: the simulated one')
+    parser.add_argument('--input', help='CSV of points with bandwidth, delay[, buffer] columns')
+    parser.add_argument('--output', help='write the predictions to this CSV instead of printing them')
+    args = parser.parse_args()
+
+    if args.input:
+        points = pd.read_csv(args.input)
+    elif args.bandwidth and args.delay:
+        bandwidth, delay = np.meshgrid(parse_values(args.bandwidth), parse_values(args.delay), indexing='ij')
+        points = pd.DataFrame({'bandwidth': bandwidth.ravel(), 'delay': delay.ravel()})
+    else:
+        parser.error('give --input or both --bandwidth and --delay')
+    if args.buffer is not None:
+        points['buffer'] = args.buffer
+
+    predictor = GapPredictor.load(args.model)
+    prediction = predictor.predict(points['bandwidth'].to_numpy(), points['delay'].to_numpy(),
+                                   points['buffer'].to_numpy() if 'buffer' in points else None)
+    result = pd.concat([points, pd.DataFrame(prediction._asdict())], axis=1)
+
+    if args.output:
+        result.to_csv(args.output, index=False)
+        print(f"Wrote {len(result)} predictions to {args.output}")
+    else:
+        print(result.to_string(index=False))
+    if result['out_of_grid'].any():
+        print(f"Warning: {int(result['out_of_grid'].sum())} points are outside the simulated grid (extrapolated)")
+
+if __name__ == '__main__':
+    main()
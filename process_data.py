@@ -1,10 +1,65 @@
-import pandas as pd
 import numpy as np
 import glob
-import os
 import re
 import matplotlib.pyplot as plt
-from collections import Counter
+
+from batching import segment_batches, modal_batch_size, batch_time_matrix
+from trace_loader import load_drop_trace
+from trace_pool import parallel_map
+
+# Gap (s) that starts a new batch, or 'auto' to pick it per trace from the
+# valley of the inter-drop gap distribution (see batching.estimate_threshold)
+BATCH_THRESHOLD = 1.0
+
+def process_file(file_path):
+    # Extract bandwidth from filename
+    match = re.search(r'bw([\dp]+)Mb', file_path)
+    if match:
+        bw_str = match.group(1)
+        bw = bw_str.replace('p', '.')
+        bandwidth = float(bw)
+    else:
+        return None  # If can't find bandwidth, skip the file
+
+    # Read the trace (2 or 3 columns, with or without header), sorted with delta_time
+    try:
+        df = load_drop_trace(file_path)
+    except Exception as e:
+        print(f"Error reading {file_path}: {e}")
+        return None
+
+    # Ignore drops before 20 seconds
+    df = df[df['timestamp'] >= 20].reset_index(drop=True)
+
+    # If no drops after 20 seconds, skip
+    if df.empty:
+        return None
+
+    # Group drops into batches where drops within BATCH_THRESHOLD are in the same batch
+    times = df['timestamp'].to_numpy()
+    batches = segment_batches(times, BATCH_THRESHOLD)
+
+    # Determine the most common batch size
+    expected_batch_size = modal_batch_size(batches.sizes)
+
+    # Prune batches that don't match the expected batch size
+    pruned = batches.sizes == expected_batch_size
+
+    # Time since last batch: first drop of a pruned batch minus last drop of the previous pruned batch
+    start_times = batches.start_times[pruned]
+    end_times = batches.end_times[pruned]
+    time_diffs_1 = (start_times[1:] - end_times[:-1]).tolist()
+
+    # Average time differences within batches, per position in the batch
+    time_diffs_within_batch = np.diff(batch_time_matrix(times, batches, pruned), axis=1)
+    avg_within_batch_diffs = time_diffs_within_batch.mean(axis=0).tolist()
+
+    return bandwidth, {
+        'time_diffs_1': time_diffs_1,
+        'avg_within_batch_diffs': avg_within_batch_diffs,
+        'expected_batch_size': expected_batch_size,
+        'batch_threshold': batches.threshold
+    }
 
 def process_files():
     # Get list of all drp.tr files
@@ -12,114 +67,13 @@ def process_files():
 
     data = {}
 
-    for file_path in file_list:
-        # Extract bandwidth from filename
-        match = re.search(r'bw([\dp]+)Mb', file_path)
-        if match:
-            bw_str = match.group(1)
-            bw = bw_str.replace('p', '.')
-            bandwidth = float(bw)
-        else:
-            continue  # If can't find bandwidth, skip the file
-
-        # Read the file, handling whether it already has delta_time or not
-        try:
-            # Try reading with three columns first
-            df = pd.read_csv(file_path, sep='\t', header=0)
-            if 'delta_time' not in df.columns or df.shape[1] < 3:
-                # If delta_time column is missing or only two columns, read again with specified names
-                df = pd.read_csv(file_path, sep='\t', header=None, names=['timestamp', 'seq'])
-                df = df.sort_values('timestamp').reset_index(drop=True)
-                df['delta_time'] = df['timestamp'].diff()
-                df['delta_time'].iloc[0] = 0.0
-                # Save the DataFrame back to the file with headers
-                df.to_csv(file_path, sep='\t', header=True, index=False)
-            else:
-                # DataFrame already has delta_time
-                df = df.sort_values('timestamp').reset_index(drop=True)
-        except Exception as e:
-            print(f"Error reading {file_path}: {e}")
-            continue
-
-        # Ignore drops before 20 seconds
-        df = df[df['timestamp'] >= 20].reset_index(drop=True)
-
-        # If no drops after 20 seconds, skip
-        if df.empty:
+    # The files are independent, process them on all cores (results come back in glob order)
+    for result in parallel_map(process_file, file_list):
+        if result is None:
             continue
-
-        # The delta_time column is already in df
-        # No need to recompute it here
-
-        # Group drops into batches where drops within 1 second are in the same batch
-        batches = []
-        current_batch = {'drops': [], 'times': []}
-        for idx, row in df.iterrows():
-            timestamp = row['timestamp']
-            seq = row['seq']
-            delta_time = row['delta_time']
-            if delta_time > 1.0:
-                # Start a new batch
-                if current_batch['drops']:
-                    batches.append(current_batch)
-                current_batch = {'drops': [seq], 'times': [timestamp]}
-            else:
-                current_batch['drops'].append(seq)
-                current_batch['times'].append(timestamp)
-        # Append the last batch
-        if current_batch['drops']:
-            batches.append(current_batch)
-
-        # Determine the most common batch size
-        batch_sizes = [len(batch['drops']) for batch in batches]
-        if not batch_sizes:
-            continue  # No batches to process
-        batch_size_counts = Counter(batch_sizes)
-        expected_batch_size = batch_size_counts.most_common(1)[0][0]
-
-        # Prune batches that don't match the expected batch size
-        pruned_batches = [batch for batch in batches if len(batch['drops']) == expected_batch_size]
-
-        # If after pruning there are no batches, skip this file
-        if not pruned_batches:
-            continue
-
-        # For each pruned batch, collect time differences
-        time_diffs_1 = []  # Time since last batch (for first drop in batch)
-        time_diffs_within_batch = []  # Time differences within batch
-
-        last_drop_time = None
-        for batch in pruned_batches:
-            times = batch['times']
-            if not times:
-                continue
-            first_drop_time = times[0]
-            # Time since last batch
-            if last_drop_time is not None:
-                time_since_last_batch = first_drop_time - last_drop_time
-                time_diffs_1.append(time_since_last_batch)
-            else:
-                # For first batch, we don't have last_drop_time
-                pass
-            last_drop_time = times[-1]  # Update last_drop_time
-
-            # Time differences within batch
-            within_batch_diffs = []
-            for i in range(1, len(times)):
-                within_batch_diffs.append(times[i] - times[i - 1])
-            time_diffs_within_batch.append(within_batch_diffs)
-
-        # Compute average time differences within batches
-        # Transpose the list of lists to get lists of time differences at each position
-        time_diffs_within_batch_transposed = list(zip(*time_diffs_within_batch))
-        avg_within_batch_diffs = [np.mean(diffs) for diffs in time_diffs_within_batch_transposed]
-
+        bandwidth, entry = result
         # Store the collected time differences in the data dictionary
-        data[bandwidth] = {
-            'time_diffs_1': time_diffs_1,
-            'avg_within_batch_diffs': avg_within_batch_diffs,
-            'expected_batch_size': expected_batch_size
-        }
+        data[bandwidth] = entry
 
     return data
 
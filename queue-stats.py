@@ -0,0 +1,84 @@
+import argparse
+import glob
+import os
+import re
+from functools import partial
+
+import pandas as pd
+
+from queue_stats import PERCENTILES, RED_MAX_TH, RED_MIN_TH, window_edges, windowed_queue_stats
+from sweep_cache import TRACE_NAME, parse_run_name
+from trace_loader import load_buffer_trace
+from trace_pool import parallel_map
+
+# Time-weighted queue occupancy of every run of a sweep, for comparing the
+# AQMs (RED / CoDel / FqCoDel) over the same bandwidth x delay points:
+#   python queue-stats.py 'CD-bw*Mb-dlay*-buf.tr' 'RED-bw*Mb-dlay*-buf.tr' --start 20
+# One CSV row per run (or per run and window with --window).
+
+def run_queue_stats(file_path, start, end, window, min_th, max_th, percentiles):
+    run = parse_run_name(file_path, TRACE_NAME) or {}
+    try:
+        times, qlens = load_buffer_trace(file_path)
+    except Exception as e:
+        print(f"Error reading {file_path}: {e}")
+        return []
+
+    if window:
+        windows = window_edges(times, window, start, end)
+    elif len(times):
+        windows = [(times[0] if start is None else start, times[-1] if end is None else end)]
+    else:
+        windows = []
+    rows = windowed_queue_stats(times, qlens, windows, min_th=min_th, max_th=max_th, percentiles=percentiles)
+
+    name = re.sub(r'-buf\.(tr|npz)$', '', os.path.basename(file_path))
+    for row in rows:
+        row.update({'run': name, 'qdisc': run.get('qdisc'), 'bandwidth': run.get('bandwidth'),
+                    'delay': run.get('delay'), 'buffer': run.get('buffer'), 'n_records': len(times)})
+    return rows
+
+def one_trace_per_run(paths):
+    # A run matched both as -buf.tr and -buf.npz is read once, from the .npz
+    # (the form companion_trace prefers)
+    runs = {}
+    for path in sorted(paths):
+        base = re.sub(r'-buf\.(tr|npz)$', '', path)
+        if base not in runs or path.endswith('.npz'):
+            runs[base] = path
+    return sorted(runs.values())
+
+def main():
+    parser = argparse.ArgumentParser(description='Time-weighted queue occupancy statistics of every run')
+    parser.add_argument('patterns', nargs='*', default=['FQCD-bw*Mb-dlay*-buf.tr'], help='globs of the buffer traces')
+    parser.add_argument('--start', type=float, help='start of the analysed interval (s), default: first record')
+    parser.add_argument('--end', type=float, help='end of the analysed interval (s), default: last record')
+    parser.add_argument('--window', type=float, help='split the interval into windows of this many seconds')
+    parser.add_argument('--min-th', type=float, default=RED_MIN_TH, help='RED minTh (packets)')
+    parser.add_argument('--max-th', type=float, default=RED_MAX_TH, help='RED maxTh (packets)')
+    parser.add_argument('--percentiles', type=float, nargs='+', default=list(PERCENTILES), help='time-weighted percentiles')
+    parser.add_argument('--output', default='queue-stats.csv', help='CSV with one row per run (and window)')
+    parser.add_argument('-j', '--jobs', type=int, help='worker processes (default: one per CPU)')
+    args = parser.parse_args()
+
+    file_list = one_trace_per_run({path for pattern in args.patterns for path in glob.glob(pattern)})
+    if not file_list:
+        print("No buffer traces found.")
+        return
+
+    stats = partial(run_queue_stats, start=args.start, end=args.end, window=args.window,
+                    min_th=args.min_th, max_th=args.max_th, percentiles=args.percentiles)
+    rows = [row for run_rows in parallel_map(stats, file_list, jobs=args.jobs) for row in run_rows]
+    if not rows:
+        print("No data to process.")
+        return
+
+    table = pd.DataFrame(rows)
+    first = ['run', 'qdisc', 'bandwidth', 'delay', 'buffer', 'n_records', 'window_start', 'window_end']
+    table = table[first + [c for c in table.columns if c not in first]]
+    table.to_csv(args.output, index=False)
+    print(f"{len(table)} rows for {len(file_list)} runs written to {args.output}")
+    print(table.groupby('qdisc')[['mean', 'idle_fraction', 'frac_above_min_th', 'frac_above_max_th']].mean())
+
+if __name__ == '__main__':
+    main()
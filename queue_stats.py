@@ -0,0 +1,100 @@
+import numpy as np
+
+# Time-weighted statistics of the queue length step function of a -buf.tr
+# trace. Every record sets the queue length until the next record, so each
+# length is weighted by how long it held (np.diff of the timestamps), not by
+# how many enqueue/dequeue events logged it. The queue is empty before the
+# first record.
+#
+# RED (lost-topo.cc --redMinTh/--redMaxTh, 5 and 15 packets by default) drops
+# probabilistically once its average queue reaches minTh and always from
+# maxTh; the time_above_* columns report how long the instantaneous queue
+# spent at or above those thresholds, which also makes CoDel and FqCoDel runs
+# comparable to RED ones.
+
+RED_MIN_TH = 5
+RED_MAX_TH = 15
+PERCENTILES = (50, 90, 99)
+
+
+def step_segments(times, qlens, start=None, end=None):
+    # (values, durations) of the step function clipped to [start, end).
+    # start / end default to the first / last record.
+    times = np.asarray(times, dtype=np.float64)
+    qlens = np.asarray(qlens, dtype=np.float64)
+    if times.size == 0:
+        return np.array([]), np.array([])
+    start = times[0] if start is None else start
+    end = times[-1] if end is None else end
+    if end <= start:
+        return np.array([]), np.array([])
+
+    lo = np.searchsorted(times, start, side='right')
+    hi = np.searchsorted(times, end, side='left')
+    initial = qlens[lo - 1] if lo > 0 else 0.0
+    values = np.concatenate(([initial], qlens[lo:hi]))
+    durations = np.diff(np.concatenate(([start], times[lo:hi], [end])))
+    return values, durations
+
+
+def weighted_percentiles(values, weights, percentiles):
+    # Smallest value whose cumulative weight reaches each percentile
+    order = np.argsort(values, kind='stable')
+    cumulative = np.cumsum(weights[order])
+    targets = np.asarray(percentiles, dtype=np.float64) / 100 * cumulative[-1]
+    index = np.minimum(np.searchsorted(cumulative, targets, side='left'), len(order) - 1)
+    return values[order][index]
+
+
+def occupancy_stats(values, durations, min_th=RED_MIN_TH, max_th=RED_MAX_TH, percentiles=PERCENTILES):
+    # Statistics of one (values, durations) step function as a dict
+    held = durations > 0
+    values, durations = values[held], durations[held]
+    stats = {'duration': float(durations.sum())}
+    if values.size == 0:
+        stats.update({'mean': np.nan, 'std': np.nan, 'max': np.nan})
+        stats.update({f"p{p:g}": np.nan for p in percentiles})
+        stats.update({'time_above_min_th': 0.0, 'frac_above_min_th': np.nan,
+                      'time_above_max_th': 0.0, 'frac_above_max_th': np.nan, 'idle_fraction': np.nan})
+        return stats
+
+    total = stats['duration']
+    mean = float(np.sum(values * durations) / total)
+    stats['mean'] = mean
+    stats['std'] = float(np.sqrt(np.sum((values - mean) ** 2 * durations) / total))
+    stats['max'] = float(values.max())
+    for p, value in zip(percentiles, weighted_percentiles(values, durations, percentiles)):
+        stats[f"p{p:g}"] = float(value)
+    for name, threshold in (('min_th', min_th), ('max_th', max_th)):
+        time_above = float(durations[values >= threshold].sum())
+        stats[f"time_above_{name}"] = time_above
+        stats[f"frac_above_{name}"] = time_above / total
+    stats['idle_fraction'] = float(durations[values == 0].sum() / total)
+    return stats
+
+
+def queue_stats(times, qlens, start=None, end=None, **kwargs):
+    # Statistics of a buffer trace over [start, end)
+    return occupancy_stats(*step_segments(times, qlens, start, end), **kwargs)
+
+
+def window_edges(times, window, start=None, end=None):
+    # [(start, end)] of consecutive windows of the given length (the last one
+    # may be shorter) covering start..end, by default the whole trace
+    times = np.asarray(times, dtype=np.float64)
+    if times.size == 0:
+        return []
+    start = times[0] if start is None else start
+    end = times[-1] if end is None else end
+    edges = np.append(np.arange(start, end, window), end)
+    return list(zip(edges[:-1].tolist(), edges[1:].tolist()))
+
+
+def windowed_queue_stats(times, qlens, windows, **kwargs):
+    # One statistics dict per (start, end) window, with window_start / window_end
+    rows = []
+    for start, end in windows:
+        row = {'window_start': start, 'window_end': end}
+        row.update(queue_stats(times, qlens, start, end, **kwargs))
+        rows.append(row)
+    return rows
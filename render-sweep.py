@@ -0,0 +1,202 @@
+import argparse
+import glob
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+import matplotlib
+matplotlib.use('Agg')  # headless, must be set before pyplot is imported
+import matplotlib.pyplot as plt
+import numpy as np
+
+from batching import segment_batches
+from figures import draw_gap_heatmap, draw_gap_histogram, draw_seq_ack_buffer, figure_paths, is_up_to_date, save_figure
+from pcap_reader import read_seq_ack
+from signals import common_start
+from sweep_cache import DEFAULT_CACHE, sweep_summary
+from trace_loader import companion_trace, load_buffer_trace, load_drop_trace
+from trace_pool import parallel_map
+
+# Render the figures of a whole sweep without a display, one worker process
+# per run:
+#   <base>-seqack   SEQ/ACK/buffer/drops plot (when the run has one pcap, or
+#                   the one named by --pcap-suffix)
+#   <base>-gaps     histogram of the gaps between drop batches
+#   sweep-heatmap   average batch gap over bandwidth x delay
+# Runs are taken from a glob of drop traces or from the sweep.py manifest.
+# Figures newer than all of their input traces are not redrawn (--force to redraw).
+#   python render-sweep.py 'FQCD-bw*Mb-dlay*-drp.tr' --format png svg -j 8
+
+DROP_SUFFIX = '-drp.tr'
+
+
+def manifest_traces(manifest_path):
+    # Drop traces of the successful runs in a sweep.py manifest (last record wins)
+    records = {}
+    with open(manifest_path, 'r') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                records[record['output_file']] = record
+    return sorted(path for path, record in records.items()
+                  if record.get('exit_status') == 0 and os.path.exists(path))
+
+
+def run_inputs(drop_file, pcap_suffix=None):
+    # Base name of the run, its candidate captures and its buffer trace. The
+    # capture is base + pcap_suffix when given, otherwise base.pcap or
+    # base-<node>-<dev>.pcap; several of those are returned as they are, the
+    # caller must not guess which one is the bottleneck link.
+    base = drop_file[:-len(DROP_SUFFIX)] if drop_file.endswith(DROP_SUFFIX) else os.path.splitext(drop_file)[0]
+    if pcap_suffix is not None:
+        pcaps = [base + pcap_suffix] if os.path.exists(base + pcap_suffix) else []
+    else:
+        pattern = glob.escape(base)
+        pcaps = sorted(glob.glob(pattern + '.pcap') + glob.glob(pattern + '-*.pcap'))
+    return base, pcaps, companion_trace(drop_file, 'buf')
+
+
+def render_seq_ack(drop_file, pcap_file, buffer_file, out_base, formats, sender_ip, receiver_ip):
+    sent_times, sent_seqs, ack_times, ack_acks = read_seq_ack(pcap_file, sender_ip, receiver_ip)
+    if len(sent_seqs) == 0 or len(ack_acks) == 0:
+        return 'no SEQ/ACK packets'
+    if buffer_file is not None:
+        buffer_times, buffer_lengths = load_buffer_trace(buffer_file)
+    else:
+        buffer_times, buffer_lengths = np.array([]), np.array([])
+    drops = load_drop_trace(drop_file)
+    drop_times = drops['timestamp'].to_numpy()
+    drop_seqs = drops['seq'].to_numpy(dtype=np.float64)
+
+    # Align the timestamps, and SEQ to 0
+    start_time = common_start(sent_times, ack_times, buffer_times, drop_times)
+    start_seq = float(sent_seqs[0])
+
+    fig, ax1 = plt.subplots(figsize=(12, 6))
+    draw_seq_ack_buffer(ax1, sent_times - start_time, sent_seqs - start_seq, ack_times - start_time,
+                        ack_acks - start_seq, buffer_times - start_time, buffer_lengths,
+                        drop_times - start_time, drop_seqs - start_seq)
+    ax1.set_title(os.path.basename(out_base))
+    save_figure(fig, out_base, formats)
+    plt.close(fig)
+
+
+def render_gaps(drop_file, out_base, formats, threshold, min_time):
+    times = load_drop_trace(drop_file)['timestamp'].to_numpy()
+    times = times[times >= min_time]
+    if times.size == 0:
+        return 'no drops'
+    batches = segment_batches(times, threshold)
+    if len(batches.inter_gaps) == 0:
+        return 'fewer than two batches'
+    fig, ax = plt.subplots(figsize=(10, 6))
+    draw_gap_histogram(ax, batches.inter_gaps, f"{os.path.basename(out_base)} (threshold {batches.threshold:.3f}s)")
+    save_figure(fig, out_base, formats)
+    plt.close(fig)
+
+
+def render_run(drop_file, outdir, formats, force, threshold, min_time, sender_ip, receiver_ip, pcap_suffix=None):
+    # Figures of one run (run in a worker process), returns (drop_file, messages)
+    base, pcaps, buffer_file = run_inputs(drop_file, pcap_suffix)
+    name = os.path.basename(base)
+    messages = []
+    jobs = [('gaps', [drop_file],
+             partial(render_gaps, drop_file, threshold=threshold, min_time=min_time))]
+    if len(pcaps) > 1:
+        messages.append(f"seqack: skipped, several captures ({', '.join(os.path.basename(path) for path in pcaps)}), "
+                        "choose one with --pcap-suffix")
+    elif pcaps:
+        pcap_file = pcaps[0]
+        jobs.insert(0, ('seqack', [drop_file, pcap_file, buffer_file],
+                        partial(render_seq_ack, drop_file, pcap_file, buffer_file,
+                                sender_ip=sender_ip, receiver_ip=receiver_ip)))
+    for kind, inputs, render in jobs:
+        out_base = os.path.join(outdir, f"{name}-{kind}")
+        if not force and is_up_to_date(figure_paths(out_base, formats), inputs):
+            messages.append(f"{kind}: up to date")
+            continue
+        try:
+            skipped = render(out_base=out_base, formats=formats)
+        except Exception as e:
+            plt.close('all')
+            messages.append(f"{kind}: error {e}")
+            continue
+        messages.append(f"{kind}: skipped, {skipped}" if skipped else f"{kind}: rendered")
+    return drop_file, messages
+
+
+def render_isolated(render, drop_files):
+    # One short-lived worker per run, used once the pool has broken: a run that
+    # kills its worker (e.g. out of memory) then only loses its own figures.
+    # Runs already rendered before the pool broke are up to date and skipped.
+    for drop_file in drop_files:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            try:
+                yield pool.submit(render, drop_file).result()
+            except BrokenProcessPool:
+                yield drop_file, ['error, worker process died']
+
+
+def render_heatmap(drop_files, outdir, formats, force, threshold, min_time, cache_path, jobs):
+    out_base = os.path.join(outdir, 'sweep-heatmap')
+    if not force and is_up_to_date(figure_paths(out_base, formats), drop_files):
+        return 'up to date'
+    df = sweep_summary(drop_files, threshold, min_time, cache_path=cache_path, jobs=jobs)
+    df = df[df['status'] == 'ok']
+    if df.empty:
+        return 'skipped, no runs with batch gaps'
+    fig, ax = plt.subplots(figsize=(12, 8))
+    draw_gap_heatmap(ax, df)
+    save_figure(fig, out_base, formats)
+    plt.close(fig)
+    return 'rendered'
+
+
+def parse_threshold(value):
+    return value if value == 'auto' else float(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render the figures of every sweep run without a display')
+    parser.add_argument('pattern', nargs='?', default='FQCD-bw*Mb-dlay*-drp.tr', help='glob of the drop traces')
+    parser.add_argument('--manifest', help='take the runs from a sweep.py manifest instead of the glob')
+    parser.add_argument('--outdir', default='figures', help='directory for the figures')
+    parser.add_argument('--format', nargs='+', default=['png'], choices=['png', 'svg', 'pdf'], help='output formats')
+    parser.add_argument('--threshold', type=parse_threshold, default=0.34, help="gap (s) that starts a new batch, or 'auto'")
+    parser.add_argument('--min-time', type=float, default=0, help='ignore drops before this time (s)')
+    parser.add_argument('--sender-ip', default='10.0.1.1')
+    parser.add_argument('--receiver-ip', default='10.0.2.2')
+    parser.add_argument('--pcap-suffix',
+                        help='capture of every run, appended to the run name (e.g. --pcap-suffix=-0-0.pcap)')
+    parser.add_argument('--cache', default=DEFAULT_CACHE, help='summary cache used for the heatmap')
+    parser.add_argument('-j', '--jobs', type=int, help='worker processes (default: one per CPU)')
+    parser.add_argument('--force', action='store_true', help='redraw figures that are up to date')
+    args = parser.parse_args()
+
+    drop_files = manifest_traces(args.manifest) if args.manifest else sorted(glob.glob(args.pattern))
+    if not drop_files:
+        print("No drop traces found.")
+        return
+    os.makedirs(args.outdir, exist_ok=True)
+
+    render = partial(render_run, outdir=args.outdir, formats=args.format, force=args.force,
+                     threshold=args.threshold, min_time=args.min_time,
+                     sender_ip=args.sender_ip, receiver_ip=args.receiver_ip, pcap_suffix=args.pcap_suffix)
+    # One run per task, rendering times vary a lot between runs
+    try:
+        results = parallel_map(render, drop_files, jobs=args.jobs, chunksize=1)
+    except BrokenProcessPool:
+        print("A worker process died, rendering every run in its own process")
+        results = render_isolated(render, drop_files)
+    for drop_file, messages in results:
+        print(f"{drop_file}: {', '.join(messages)}")
+
+    status = render_heatmap(drop_files, args.outdir, args.format, args.force, args.threshold,
+                            args.min_time, args.cache, args.jobs)
+    print(f"sweep-heatmap: {status}")
+
+
+if __name__ == '__main__':
+    main()
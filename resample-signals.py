@@ -0,0 +1,65 @@
+import argparse
+import glob
+import os
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from signals import common_start, resample_run, uniform_edges
+from trace_loader import companion_trace, load_buffer_trace, load_cwnd_trace, load_drop_trace
+from trace_pool import parallel_map
+
+# Buffer, cwnd and drop traces of every run on one uniform time grid, so they
+# can be compared bin by bin (e.g. drops per bin against the mean queue):
+#   python resample-signals.py 'CD-bw*Mb-dlay*-drp.tr' --resolution 0.1
+# Writes <run>-grid.csv with t, qlen_mean/max/last, cwnd_last/mean, drops.
+# t is relative to the first record of the run unless --absolute is given.
+
+def resample_file(drop_file, resolution, outdir, absolute):
+    buffer_file = companion_trace(drop_file, 'buf')
+    cwnd_file = companion_trace(drop_file, 'cwn')
+    try:
+        drop_times = load_drop_trace(drop_file)['timestamp'].to_numpy()
+        buffer = load_buffer_trace(buffer_file) if buffer_file else None
+        cwnd = load_cwnd_trace(cwnd_file) if cwnd_file else None
+    except Exception as e:
+        return drop_file, f"error {e}"
+
+    signals = [drop_times] + [signal[0] for signal in (buffer, cwnd) if signal is not None]
+    start = common_start(*signals)
+    if start is None:
+        return drop_file, "no records"
+    end = max(times[-1] for times in signals if len(times))
+    edges = uniform_edges(start, end, resolution)
+
+    grid = pd.DataFrame(resample_run(edges, buffer, cwnd, drop_times))
+    if not absolute:
+        grid['t'] = resolution * np.arange(len(grid))
+    out_path = os.path.join(outdir or os.path.dirname(drop_file),
+                            os.path.basename(drop_file).replace('-drp.tr', '') + '-grid.csv')
+    grid.to_csv(out_path, index=False)
+    return drop_file, f"{len(grid)} bins -> {out_path}"
+
+def main():
+    parser = argparse.ArgumentParser(description='Resample the traces of every run onto a common time grid')
+    parser.add_argument('pattern', nargs='?', default='FQCD-bw*Mb-dlay*-drp.tr', help='glob of the drop traces')
+    parser.add_argument('--resolution', type=float, default=0.1, help='grid step (s)')
+    parser.add_argument('--outdir', help='directory for the grids (default: next to the traces)')
+    parser.add_argument('--absolute', action='store_true', help='keep the simulation time instead of starting at 0')
+    parser.add_argument('-j', '--jobs', type=int, help='worker processes (default: one per CPU)')
+    args = parser.parse_args()
+
+    file_list = sorted(glob.glob(args.pattern))
+    if not file_list:
+        print("No drop traces found.")
+        return
+    if args.outdir:
+        os.makedirs(args.outdir, exist_ok=True)
+
+    resample = partial(resample_file, resolution=args.resolution, outdir=args.outdir, absolute=args.absolute)
+    for drop_file, message in parallel_map(resample, file_list, jobs=args.jobs):
+        print(f"{drop_file}: {message}")
+
+if __name__ == '__main__':
+    main()
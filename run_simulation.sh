@@ -1,5 +1,6 @@
 # collect BW from 1mbps to 10mbps
 # collect RTT from 10ms to 400ms
+# (sweep.py runs the same grid in parallel)
 
 for (( i=10; i<=100; i+=1 ))
 do
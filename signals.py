@@ -0,0 +1,181 @@
+import numpy as np
+
+# Vectorised alignment of the irregular trace signals (queue length, cwnd,
+# drops). Every signal is a pair of sorted arrays (times, values) that holds
+# its value until the next record, so the value at any instant is an as-of
+# lookup: the last record at or before it, found with np.searchsorted for all
+# instants at once.
+
+
+def asof_index(times, at, strict=False):
+    # Index of the last record at or before every instant of at (strictly
+    # before with strict=True), -1 before the first record
+    side = 'left' if strict else 'right'
+    return np.searchsorted(times, at, side=side) - 1
+
+
+def asof_lookup(times, values, at, strict=False, default=np.nan):
+    # Value of the step signal (times, values) at every instant of at
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values)
+    at = np.asarray(at, dtype=np.float64)
+    index = asof_index(times, at, strict)
+    found = index >= 0
+    result = np.full(at.shape, default, dtype=np.result_type(values.dtype, np.min_scalar_type(default)))
+    result[found] = values[index[found]]
+    return result
+
+
+def enrich_drops(drops, buffer=None, cwnd=None, queue_limit=None):
+    # Copy of the drop table with the queue state at every drop:
+    #   qlen         queue length at the drop (last update at or before it)
+    #   qlen_before  queue length just before the drop instant
+    #   cwnd         sender cwnd (bytes) at the drop
+    #   tail_drop    queue at its limit when the packet was dropped
+    # buffer and cwnd are (times, values) pairs. The queue is empty before its
+    # first record; the cwnd is NaN before its first record.
+    enriched = drops.copy()
+    times = drops['timestamp'].to_numpy()
+    if buffer is not None:
+        enriched['qlen'] = asof_lookup(*buffer, times, default=0).astype(np.int64)
+        enriched['qlen_before'] = asof_lookup(*buffer, times, strict=True, default=0).astype(np.int64)
+        if queue_limit is not None and queue_limit > 0:
+            enriched['tail_drop'] = enriched['qlen'] >= queue_limit
+    if cwnd is not None:
+        enriched['cwnd'] = asof_lookup(*cwnd, times)
+    return enriched
+
+
+def drop_state_summary(enriched):
+    # Per-run counts of the enriched drops, e.g. how many were tail drops
+    summary = {'n_drops': len(enriched)}
+    if 'qlen' in enriched:
+        summary['mean_qlen_at_drop'] = float(enriched['qlen'].mean()) if len(enriched) else np.nan
+    if 'tail_drop' in enriched:
+        summary['n_tail_drops'] = int(enriched['tail_drop'].sum())
+        summary['n_early_drops'] = int((~enriched['tail_drop']).sum())
+    if 'cwnd' in enriched:
+        summary['mean_cwnd_at_drop'] = float(np.nanmean(enriched['cwnd'])) if enriched['cwnd'].notna().any() else np.nan
+    return summary
+
+
+def common_start(*series_times):
+    # Earliest time over several time arrays (empty ones are ignored), the
+    # origin the plotters align every signal to
+    firsts = [np.min(times) for times in series_times if len(times)]
+    return min(firsts) if firsts else None
+
+
+# Resampling onto a common uniform grid. A grid is given by its bin edges
+# (uniform_edges); every function returns one value per bin [edges[i], edges[i+1]).
+# Step signals (queue length, cwnd) hold their value between records, event
+# signals (drops) only exist at their records.
+
+STEP_AGGREGATIONS = ('last', 'mean', 'max', 'count')
+EVENT_AGGREGATIONS = ('count', 'last', 'mean', 'max', 'sum')
+
+
+def uniform_edges(start, end, resolution):
+    # Bin edges from start to (at least) end, resolution seconds apart
+    n_bins = max(int(np.ceil((end - start) / resolution - 1e-9)), 1)
+    return start + resolution * np.arange(n_bins + 1)
+
+
+def segment_reduce(ufunc, values, starts, ends, empty=np.nan):
+    # ufunc.reduce of values[starts[i]:ends[i]] for every i, empty where the
+    # segment is empty, in one reduceat call
+    result = np.full(len(starts), empty, dtype=np.float64)
+    nonempty = ends > starts
+    if not nonempty.any():
+        return result
+    # Interleaved (start, end) pairs: the even outputs are the segment reductions
+    padded = np.append(np.asarray(values, dtype=np.float64), 0.0)
+    index = np.column_stack((starts[nonempty], ends[nonempty])).ravel()
+    result[nonempty] = ufunc.reduceat(padded, index)[::2]
+    return result
+
+
+def resample_step(times, values, edges, how='last', initial=np.nan):
+    # A step signal on the grid. initial is its value before the first record
+    # (0 for a queue, NaN for cwnd).
+    #   last  value held at the end of the bin
+    #   mean  time-weighted mean over the bin
+    #   max   largest value held in the bin
+    #   count number of records in the bin
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    edges = np.asarray(edges, dtype=np.float64)
+    if how == 'count':
+        return np.diff(np.searchsorted(times, edges, side='left')).astype(np.int64)
+    if how == 'last':
+        return asof_lookup(times, values, edges[1:], strict=True, default=initial)
+    if how == 'max':
+        # Only the last record of a timestamp is ever held, the others last
+        # zero time (e.g. an enqueue and a dequeue logged at the same instant)
+        if times.size:
+            held = np.append(times[1:] != times[:-1], True)
+            times, values = times[held], values[held]
+        entering = asof_lookup(times, values, edges[:-1], default=initial)
+        inside = segment_reduce(np.maximum, values, np.searchsorted(times, edges[:-1], side='right'),
+                                np.searchsorted(times, edges[1:], side='left'), empty=-np.inf)
+        # fmax ignores the NaN initial value; a bin with nothing held is NaN
+        peak = np.fmax(entering, inside)
+        peak[np.isneginf(peak)] = np.nan
+        return peak
+    if how == 'mean':
+        # Integral of the signal at the edges, from the cumulative area of the
+        # steps, with a virtual first record holding the initial value
+        # (a NaN initial value only makes the bins before the first record NaN)
+        first = times[0] if times.size else np.inf
+        origin = min(edges[0], first)
+        times = np.concatenate(([origin], times))
+        values = np.concatenate(([0.0 if np.isnan(initial) else initial], values))
+        area = np.concatenate(([0.0], np.cumsum(values[:-1] * np.diff(times))))
+        index = asof_index(times, edges)
+        integral = area[index] + values[index] * (edges - times[index])
+        mean = np.diff(integral) / np.diff(edges)
+        if np.isnan(initial):
+            mean[edges[:-1] < first] = np.nan
+        return mean
+    raise ValueError(f"unknown step aggregation {how!r}, use one of {STEP_AGGREGATIONS}")
+
+
+def resample_events(times, edges, values=None, how='count'):
+    # Events (e.g. drop timestamps, with optional values such as seq) on the
+    # grid: count per bin, or last / mean / max / sum of the values in the bin
+    # (NaN for bins without events)
+    times = np.asarray(times, dtype=np.float64)
+    bounds = np.searchsorted(times, np.asarray(edges, dtype=np.float64), side='left')
+    counts = np.diff(bounds)
+    if how == 'count':
+        return counts.astype(np.int64)
+    if how not in EVENT_AGGREGATIONS:
+        raise ValueError(f"unknown event aggregation {how!r}, use one of {EVENT_AGGREGATIONS}")
+    values = np.asarray(values, dtype=np.float64)
+    starts, ends = bounds[:-1], bounds[1:]
+    if how == 'last':
+        result = np.full(len(counts), np.nan)
+        result[counts > 0] = values[ends[counts > 0] - 1]
+        return result
+    if how == 'max':
+        return segment_reduce(np.maximum, values, starts, ends)
+    sums = segment_reduce(np.add, values, starts, ends, empty=0.0)
+    if how == 'sum':
+        return sums
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def resample_run(edges, buffer=None, cwnd=None, drop_times=None):
+    # Buffer, cwnd and drop signals of one run on the grid, as columns of a
+    # dict (t is the start of every bin)
+    columns = {'t': edges[:-1]}
+    if buffer is not None:
+        for how in ('mean', 'max', 'last'):
+            columns[f"qlen_{how}"] = resample_step(*buffer, edges, how, initial=0)
+    if cwnd is not None:
+        columns['cwnd_last'] = resample_step(*cwnd, edges, 'last')
+        columns['cwnd_mean'] = resample_step(*cwnd, edges, 'mean')
+    if drop_times is not None:
+        columns['drops'] = resample_events(drop_times, edges)
+    return columns
@@ -0,0 +1,187 @@
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Parallel version of run_simulation.sh.
+# Runs the same bandwidth x delay grid of lost-topo.cc simulations, N at a time,
+# with the same FQCD-bw...-dlay...-b450p file names, and appends one JSON line
+# per finished run (parameters, exit status, wall time, output size and sha256)
+# to a manifest.
+#
+# The manifest makes the sweep resumable: runs are keyed by
+# (bandwidth, delay, queue disc, buffer size, TCP variant), and a restart skips
+# every point whose last record succeeded and whose drop trace still has the
+# recorded size and checksum. Missing, failed or truncated points are re-queued.
+#
+# Build ns-3 once (./ns3 build) and pass --no-build, otherwise every concurrent
+# "./ns3 run" also checks the build. Any executable taking the same arguments
+# as ./ns3 can be given with --ns3, e.g. a stub script for testing.
+
+
+def bw_label(bw_tenths):
+    # 15 -> '1.5' (what bc prints in run_simulation.sh)
+    return f"{bw_tenths // 10}.{bw_tenths % 10}"
+
+
+def fname_base(prefix, bw_tenths, rtt, buffer_size):
+    # Same as run_simulation.sh: FQCD-bw1p5Mb-dlay100-b450p
+    bw_str = bw_label(bw_tenths).replace('.', 'p', 1)
+    return f"{prefix}-bw{bw_str}Mb-dlay{rtt}-b{buffer_size}p"
+
+
+def sweep_points(args):
+    # Bandwidth is walked in tenths of Mbps to avoid float steps.
+    # dlay in the file name is the RTT, each of the 4 link traversals gets rtt/4 ms.
+    points = []
+    for bw_tenths in range(round(args.bw_min * 10), round(args.bw_max * 10) + 1, round(args.bw_step * 10)):
+        for rtt in range(args.rtt_min, args.rtt_max + 1, args.rtt_step):
+            base = fname_base(args.prefix, bw_tenths, rtt, args.buffer_size)
+            points.append({
+                'bandwidth': bw_label(bw_tenths),
+                'delay': rtt // 4,
+                'rtt': rtt,
+                'queue_disc': args.queue_disc,
+                'buffer_size': args.buffer_size,
+                'tcp': args.tcp,
+                'fname_base': base,
+                'output_file': base + '-drp.tr',
+            })
+    return points
+
+
+def point_key(point):
+    return (point['bandwidth'], point['delay'], point['queue_disc'], point['buffer_size'], point['tcp'])
+
+
+def file_digest(file_path):
+    # (size, sha256) of a file, (None, None) if it does not exist
+    if not os.path.exists(file_path):
+        return None, None
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return os.path.getsize(file_path), sha.hexdigest()
+
+
+def load_manifest(manifest_path):
+    # Last record per parameter key; a line cut short by a crash is ignored
+    completed = {}
+    if not os.path.exists(manifest_path):
+        return completed
+    with open(manifest_path, 'r') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            completed[point_key(record)] = record
+    return completed
+
+
+def is_complete(record):
+    if record is None or record.get('exit_status') != 0 or record.get('output_size') is None:
+        return False
+    size, sha256 = file_digest(record['output_file'])
+    return size == record['output_size'] and sha256 == record['output_sha256']
+
+
+def pending_points(points, manifest_path):
+    completed = load_manifest(manifest_path)
+    return [point for point in points if not is_complete(completed.get(point_key(point)))]
+
+
+def build_command(point, args):
+    sim_args = [
+        args.script,
+        f"--bottleneckBandwidth={point['bandwidth']}Mbps",
+        f"--accessDelay={point['delay']}ms",
+        f"--bottleneckDelay={point['delay']}ms",
+        f"--queueDiscType={point['queue_disc']}",
+        f"--queueDiscSize={point['buffer_size']}",
+        f"--tcpTypeId={point['tcp']}",
+        f"--dropTrFileName={point['output_file']}",
+    ]
+    if args.trace_buffer_size:
+        sim_args.append(f"--traceBufferSize={args.trace_buffer_size}")
+    command = [args.ns3, 'run']
+    if args.no_build:
+        command.append('--no-build')
+    command.append(' '.join(sim_args))
+    return command
+
+
+def run_point(point, command):
+    # Executed in a worker process
+    start = time.time()
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    record = dict(point)
+    record['exit_status'] = result.returncode
+    record['wall_time'] = time.time() - start
+    record['finished_at'] = time.time()
+    record['output_size'], record['output_sha256'] = file_digest(point['output_file'])
+    if result.returncode != 0:
+        # Keep the end of stderr to see why the run failed
+        record['error'] = result.stderr[-2000:]
+    return record
+
+
+def run_sweep(points, args):
+    records = []
+    with open(args.manifest, 'a') as manifest, ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {}
+        for point in points:
+            futures[pool.submit(run_point, point, build_command(point, args))] = point
+
+        for done, future in enumerate(as_completed(futures), start=1):
+            record = future.result()
+            manifest.write(json.dumps(record) + '\n')
+            manifest.flush()
+            records.append(record)
+            status = 'ok' if record['exit_status'] == 0 else f"failed ({record['exit_status']})"
+            print(f"[{done}/{len(points)}] {record['fname_base']} {status} in {record['wall_time']:.1f}s")
+    return records
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Run the lost-topo.cc bandwidth x delay sweep in parallel')
+    parser.add_argument('--ns3', default='./ns3', help='ns3 launcher (or a stub with the same arguments)')
+    parser.add_argument('--script', default='scratch/lost-topo.cc', help='simulation script passed to "ns3 run"')
+    parser.add_argument('--no-build', action='store_true', help='pass --no-build to "ns3 run"')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='number of concurrent simulations')
+    parser.add_argument('--manifest', default='sweep-manifest.jsonl', help='JSON lines file with one record per run')
+    parser.add_argument('--force', action='store_true', help='rerun every point, even the ones the manifest marks complete')
+    parser.add_argument('--prefix', default='FQCD', help='file name prefix')
+    parser.add_argument('--queue-disc', default='CoDel', help='queueDiscType: PfifoFast, CoDel or RED')
+    parser.add_argument('--buffer-size', type=int, default=450, help='queueDiscSize in packets')
+    parser.add_argument('--trace-buffer-size', type=int, default=0,
+                        help='traceBufferSize in bytes (0 keeps the per-record flush)')
+    parser.add_argument('--tcp', default='ns3::TcpLinuxReno', help='tcpTypeId')
+    parser.add_argument('--bw-min', type=float, default=1.0, help='lowest bottleneck bandwidth (Mbps)')
+    parser.add_argument('--bw-max', type=float, default=10.0, help='highest bottleneck bandwidth (Mbps)')
+    parser.add_argument('--bw-step', type=float, default=0.1, help='bandwidth step (Mbps)')
+    parser.add_argument('--rtt-min', type=int, default=4, help='lowest RTT (ms), used as dlay in file names')
+    parser.add_argument('--rtt-max', type=int, default=240, help='highest RTT (ms)')
+    parser.add_argument('--rtt-step', type=int, default=4, help='RTT step (ms), multiple of 4')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    points = sweep_points(args)
+    if not args.force:
+        total = len(points)
+        points = pending_points(points, args.manifest)
+        print(f"{total - len(points)} of {total} points already complete")
+    print(f"Running {len(points)} simulations with {args.jobs} workers")
+    records = run_sweep(points, args)
+    failed = [r for r in records if r['exit_status'] != 0]
+    print(f"Done: {len(records) - len(failed)} succeeded, {len(failed)} failed, manifest in {args.manifest}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+import argparse
+import glob
+import os
+import re
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from batching import AUTO_THRESHOLD, segment_batches
+from trace_loader import load_drop_trace
+from trace_pool import parallel_map
+
+# Persistent per-run summary of the sweep drop traces.
+# One row per (trace file, batch threshold, start time, skip_first_gap) holding
+# the average inter-batch gap and the average drops per batch, plus the file
+# mtime and size it was computed from. The threshold can be 'auto' (stored as
+# NaN in the threshold key), the threshold actually used is in batch_threshold.
+# sweep_summary() only re-reads the traces that are new or changed since the
+# last call, everything else comes from the cache file (a single .npz, no
+# pickles).
+
+DEFAULT_CACHE = 'sweep-summary-cache.npz'
+
+RUN_PREFIX = r'(?P<qdisc>[A-Za-z]+)-bw(?P<bw>[\dp]+)Mb-dlay(?P<delay>\d+)(?:-b(?P<buffer>\d+)p)?'
+RUN_NAME = re.compile(RUN_PREFIX + r'-drp\.tr$')
+# Any trace of a run: drop, buffer (text or compact) or cwnd
+TRACE_NAME = re.compile(RUN_PREFIX + r'-(?:drp|buf|cwn)\.(?:tr|npz)$')
+
+# Column -> dtype of the cache table
+CACHE_COLUMNS = {
+    'path': str,
+    'mtime_ns': np.int64,
+    'size': np.int64,
+    'threshold': np.float64,        # requested threshold, NaN for 'auto'
+    'min_time': np.float64,
+    'skip_first_gap': bool,
+    'qdisc': str,
+    'bandwidth': np.float64,
+    'delay': np.int64,
+    'buffer': np.int64,             # -1 when the name has no -b...p part
+    'status': str,                  # ok, empty (no drops after min_time) or error
+    'error': str,
+    'n_drops': np.int64,
+    'n_batches': np.int64,
+    'batch_threshold': np.float64,  # threshold used to segment this trace
+    'avg_time_diff_between_batches': np.float64,
+    'avg_drops_per_batch': np.float64,
+}
+
+
+def parse_run_name(file_path, pattern=RUN_NAME):
+    # FQCD-bw1p5Mb-dlay100-b450p-drp.tr -> qdisc FQCD, bandwidth 1.5, delay 100, buffer 450
+    match = pattern.search(os.path.basename(file_path))
+    if not match:
+        return None
+    return {
+        'qdisc': match.group('qdisc'),
+        'bandwidth': float(match.group('bw').replace('p', '.')),
+        'delay': int(match.group('delay')),
+        'buffer': int(match.group('buffer')) if match.group('buffer') else -1,
+    }
+
+
+def empty_cache():
+    return pd.DataFrame({name: pd.Series(dtype=object if dtype is str else dtype)
+                         for name, dtype in CACHE_COLUMNS.items()})
+
+
+def load_cache(cache_path=DEFAULT_CACHE):
+    if not os.path.exists(cache_path):
+        return empty_cache()
+    try:
+        with np.load(cache_path, allow_pickle=False) as npz:
+            columns = {name: npz[name] for name in CACHE_COLUMNS}
+    except (OSError, KeyError, ValueError):
+        # Unreadable or from an older layout: start over
+        return empty_cache()
+    return typed(pd.DataFrame(columns))
+
+
+def typed(df):
+    # Same column dtypes whether the rows were computed or read from the cache
+    for name, dtype in CACHE_COLUMNS.items():
+        df[name] = df[name].astype(object if dtype is str else dtype)
+    return df
+
+
+def save_cache(df, cache_path=DEFAULT_CACHE):
+    # Write to a temporary file first so an interrupted save keeps the old cache
+    columns = {}
+    for name, dtype in CACHE_COLUMNS.items():
+        values = df[name].to_numpy()
+        columns[name] = values.astype(str) if dtype is str else values.astype(dtype)
+    tmp_path = cache_path + '.tmp.npz'
+    np.savez(tmp_path, **columns)
+    os.replace(tmp_path, cache_path)
+
+
+def summarize_trace(file_path, threshold, min_time, skip_first_gap=False):
+    # Batch statistics of one drop trace, the values the sweep plots use
+    row = {
+        'status': 'ok',
+        'error': '',
+        'n_drops': 0,
+        'n_batches': 0,
+        'batch_threshold': np.nan,
+        'avg_time_diff_between_batches': np.nan,
+        'avg_drops_per_batch': np.nan,
+    }
+    try:
+        df = load_drop_trace(file_path)
+    except Exception as e:
+        row.update(status='error', error=str(e))
+        return row
+
+    times = df['timestamp'].to_numpy()
+    times = times[times >= min_time]
+    if times.size == 0:
+        row['status'] = 'empty'
+        return row
+
+    batches = segment_batches(times, threshold)
+    # Optionally leave out the gap to the first batch (slow start)
+    inter_gaps = batches.inter_gaps[1:] if skip_first_gap else batches.inter_gaps
+    row.update(
+        n_drops=times.size,
+        n_batches=len(batches.sizes),
+        batch_threshold=batches.threshold,
+        avg_time_diff_between_batches=np.mean(inter_gaps) if len(inter_gaps) else np.nan,
+        avg_drops_per_batch=np.mean(batches.sizes),
+    )
+    return row
+
+
+def threshold_key(threshold):
+    return np.nan if threshold == AUTO_THRESHOLD else float(threshold)
+
+
+def summarize_run(file_path, threshold, min_time, skip_first_gap):
+    # Cache row of one trace (run in a worker process)
+    stat = os.stat(file_path)
+    row = {'path': file_path, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size,
+           'threshold': threshold_key(threshold), 'min_time': min_time, 'skip_first_gap': skip_first_gap}
+    row.update(parse_run_name(file_path))
+    row.update(summarize_trace(file_path, threshold, min_time, skip_first_gap))
+    return row
+
+
+def sweep_summary(pattern, threshold, min_time, skip_first_gap=False, cache_path=DEFAULT_CACHE, jobs=None):
+    # Summary rows of every run matching the glob pattern (or in a list of
+    # paths), sorted by path.
+    # Only traces that are new or whose mtime/size changed are processed,
+    # spread over jobs worker processes.
+    cache = load_cache(cache_path)
+    key = threshold_key(threshold)
+    same_threshold = cache['threshold'].isna() if np.isnan(key) else cache['threshold'] == key
+    same_params = (same_threshold & (cache['min_time'] == min_time)
+                   & (cache['skip_first_gap'] == skip_first_gap))
+    cached = {path: row for path, row in zip(cache.loc[same_params, 'path'],
+                                             cache[same_params].to_dict('records'))}
+
+    rows = {}
+    changed = []
+    file_paths = glob.glob(pattern) if isinstance(pattern, str) else pattern
+    for file_path in sorted(set(file_paths)):
+        if parse_run_name(file_path) is None:
+            continue  # If can't find bandwidth or delay, skip the file
+        stat = os.stat(file_path)
+        row = cached.get(file_path)
+        if row is None or row['mtime_ns'] != stat.st_mtime_ns or row['size'] != stat.st_size:
+            changed.append(file_path)
+        rows[file_path] = row
+
+    summarize = partial(summarize_run, threshold=threshold, min_time=min_time, skip_first_gap=skip_first_gap)
+    for row in parallel_map(summarize, changed, jobs=jobs):
+        if row['status'] == 'error':
+            print(f"Error reading {row['path']}: {row['error']}")
+        rows[row['path']] = row
+
+    summary = typed(pd.DataFrame(list(rows.values()), columns=list(CACHE_COLUMNS))) if rows else empty_cache()
+    if changed:
+        # Replace the rows of this pattern and parameter set, keep everything else
+        stale = same_params & cache['path'].isin(set(summary['path']))
+        save_cache(pd.concat([cache[~stale], summary], ignore_index=True), cache_path)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or refresh the sweep summary cache')
+    parser.add_argument('pattern', nargs='?', default='FQCD-bw*Mb-dlay*-drp.tr', help='glob of the drop traces')
+    parser.add_argument('--threshold', default='0.34', help="gap (s) that starts a new batch, or 'auto'")
+    parser.add_argument('--min-time', type=float, default=20, help='ignore drops before this time (s)')
+    parser.add_argument('--skip-first-gap', action='store_true', help='leave the first inter-batch gap out of the average')
+    parser.add_argument('--cache', default=DEFAULT_CACHE, help='cache file')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='worker processes (default: all cores)')
+    args = parser.parse_args()
+
+    threshold = args.threshold if args.threshold == AUTO_THRESHOLD else float(args.threshold)
+    summary = sweep_summary(args.pattern, threshold, args.min_time, args.skip_first_gap, args.cache, args.jobs)
+    print(summary['status'].value_counts().to_string())
+    print(summary[summary['status'] == 'ok'][['qdisc', 'bandwidth', 'delay', 'buffer', 'batch_threshold',
+                                              'avg_time_diff_between_batches', 'avg_drops_per_batch']].to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,318 @@
+import os
+import re
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Shared loader for the ns-3 drop traces (*-drp.tr).
+# lost-topo.cc writes 2 columns (timestamp, seq) and multi-topo.cc / bursty.cc
+# write 3 columns (timestamp, seq, dest_port). Older versions of the analysis
+# scripts rewrote the traces in place with a "timestamp\tseq\tdelta_time" header,
+# so that layout is accepted as well. The source file is never modified,
+# delta_time is always derived in memory.
+#
+# With --binaryTrace=true the simulations write fixed-width binary records
+# instead (see WriteBinaryTraceHeader in lost-topo.cc):
+#   "NS3TRACE", version, column count, 6 reserved bytes,
+#   then per column a 16 byte NUL padded name and a 4 byte NumPy dtype ("<f8"),
+#   then the packed records.
+# read_binary_trace maps such a file straight into a structured array.
+
+# Fixed dtype schema for the drop trace columns
+DROP_DTYPES = {
+    'timestamp': np.float64,
+    'seq': np.int64,  # wider than the 32 bit TCP seq so plotters can subtract offsets
+    'dest_port': np.int32,
+}
+
+# Column layouts of the header-less traces, keyed by the number of columns
+DROP_LAYOUTS = {
+    2: ['timestamp', 'seq'],               # lost-topo.cc
+    3: ['timestamp', 'seq', 'dest_port'],  # multi-topo.cc, bursty.cc
+}
+
+
+BINARY_MAGIC = b'NS3TRACE'
+BINARY_VERSION = 1
+BINARY_PREAMBLE_LEN = 16
+BINARY_COLUMN_LEN = 20
+
+
+def is_binary_trace(file_path):
+    with open(file_path, 'rb') as f:
+        return f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+
+def read_binary_header(f):
+    # Returns the record dtype and the offset of the first record
+    preamble = f.read(BINARY_PREAMBLE_LEN)
+    if len(preamble) < BINARY_PREAMBLE_LEN or preamble[:8] != BINARY_MAGIC:
+        raise ValueError("Not a binary ns-3 trace")
+    if preamble[8] != BINARY_VERSION:
+        raise ValueError(f"Unsupported binary trace version {preamble[8]}")
+    fields = []
+    for _ in range(preamble[9]):
+        column = f.read(BINARY_COLUMN_LEN)
+        if len(column) < BINARY_COLUMN_LEN:
+            raise ValueError("Truncated binary trace header")
+        name = column[:16].split(b'\0', 1)[0].decode('ascii')
+        fields.append((name, column[16:].split(b'\0', 1)[0].decode('ascii')))
+    return np.dtype(fields), BINARY_PREAMBLE_LEN + BINARY_COLUMN_LEN * len(fields)
+
+
+def read_binary_trace(file_path):
+    # Memory-map the records of a binary trace as a structured array (no copy).
+    # A partial record at the end (simulation still running) is left out.
+    with open(file_path, 'rb') as f:
+        dtype, offset = read_binary_header(f)
+        f.seek(0, 2)
+        n_records = (f.tell() - offset) // dtype.itemsize
+    if n_records == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(file_path, dtype=dtype, mode='r', offset=offset, shape=(n_records,))
+
+
+def parse_first_line(first_line, file_path):
+    # (header, columns) from the first line of a text drop trace
+    fields = first_line.rstrip('\r\n').split('\t')
+    if not first_line.strip():
+        return None, None
+
+    try:
+        float(fields[0])
+    except ValueError:
+        # Header line written by the old in-place rewrite
+        columns = [name for name in fields if name in DROP_DTYPES]
+        if 'timestamp' not in columns or 'seq' not in columns:
+            raise ValueError(f"Unrecognised drop trace header in {file_path}: {fields}")
+        return fields, columns
+
+    if len(fields) not in DROP_LAYOUTS:
+        raise ValueError(f"Unexpected number of columns ({len(fields)}) in {file_path}")
+    return None, DROP_LAYOUTS[len(fields)]
+
+
+def sniff_drop_trace(file_path):
+    # Look at the first line only and return (header, columns).
+    # header is None for the raw ns-3 output, columns is None for an empty file.
+    with open(file_path, 'r') as f:
+        first_line = f.readline()
+    return parse_first_line(first_line, file_path)
+
+
+def empty_drop_frame(columns=tuple(DROP_DTYPES)):
+    # An empty trace has every column (dest_port too), so callers can select
+    # or group by any of them without checking which simulation wrote it
+    df = pd.DataFrame({name: np.array([], dtype=DROP_DTYPES[name]) for name in columns})
+    df['delta_time'] = np.array([], dtype=np.float64)
+    return df
+
+
+def load_binary_drop_trace(file_path):
+    records = read_binary_trace(file_path)
+    columns = [name for name in records.dtype.names if name in DROP_DTYPES]
+    if 'timestamp' not in columns or 'seq' not in columns:
+        raise ValueError(f"Unrecognised binary drop trace columns in {file_path}: {records.dtype.names}")
+    return pd.DataFrame({name: records[name].astype(DROP_DTYPES[name]) for name in columns})
+
+
+def load_drop_trace(file_path):
+    # Read a drop trace (text or binary) into a DataFrame sorted by timestamp,
+    # with a delta_time column (time since the previous drop, 0.0 for the first one).
+    if is_binary_trace(file_path):
+        df = load_binary_drop_trace(file_path)
+    else:
+        header, columns = sniff_drop_trace(file_path)
+        if columns is None:
+            return empty_drop_frame()
+
+        dtypes = {name: DROP_DTYPES[name] for name in columns}
+        if header is not None:
+            df = pd.read_csv(file_path, sep='\t', header=0, usecols=columns, dtype=dtypes)
+        else:
+            df = pd.read_csv(file_path, sep='\t', header=None, names=columns, dtype=dtypes)
+        df = df[columns]
+
+    df = df.sort_values('timestamp', kind='stable').reset_index(drop=True)
+
+    delta_time = np.diff(df['timestamp'].to_numpy(), prepend=np.nan)
+    if len(delta_time):
+        delta_time[0] = 0.0
+    df['delta_time'] = delta_time
+
+    return df
+
+
+CHUNK_ROWS = 1 << 16  # drop records per chunk in iter_drop_chunks
+
+
+def iter_drop_chunks(source, chunk_rows=CHUNK_ROWS):
+    # Yield the drop records as DataFrames of at most chunk_rows rows, in file
+    # order, without loading the whole trace. source is a path, '-' for stdin or
+    # an open text file, so a trace can be read from a pipe (or a FIFO the
+    # simulation is still writing). No sorting and no delta_time here.
+    # Only regular files are sniffed for the binary form (it is memory-mapped):
+    # reading the magic from a FIFO would consume the start of the stream.
+    if isinstance(source, str) and os.path.isfile(source) and is_binary_trace(source):
+        records = read_binary_trace(source)
+        columns = [name for name in records.dtype.names if name in DROP_DTYPES]
+        for start in range(0, len(records), chunk_rows):
+            chunk = records[start:start + chunk_rows]
+            yield pd.DataFrame({name: chunk[name].astype(DROP_DTYPES[name]) for name in columns})
+        return
+
+    if source == '-':
+        f, name = sys.stdin, '<stdin>'
+    elif isinstance(source, str):
+        f, name = open(source, 'r'), source
+    else:
+        f, name = source, getattr(source, 'name', '<stream>')
+    try:
+        first_line = f.readline()
+        header, columns = parse_first_line(first_line, name)
+        if columns is None:
+            return
+        dtypes = {column: DROP_DTYPES[column] for column in columns}
+        if header is None:
+            # The first line is already a record
+            fields = first_line.rstrip('\r\n').split('\t')
+            yield pd.DataFrame({column: np.array([fields[i]]).astype(dtypes[column])
+                                for i, column in enumerate(columns)})
+            names, usecols = columns, None
+        else:
+            names, usecols = header, columns
+        reader = pd.read_csv(f, sep='\t', header=None, names=names, usecols=usecols,
+                             dtype=dtypes, chunksize=chunk_rows)
+        for chunk in reader:
+            if len(chunk):
+                yield chunk[columns]
+    except pd.errors.EmptyDataError:
+        # Nothing after the first line
+        return
+    finally:
+        if f is not source and f is not sys.stdin:
+            f.close()
+
+
+def load_value_trace(file_path, value_name):
+    # (time, value) arrays of a two column trace (-buf.tr, -cwn.tr), text or
+    # binary. A header line, if any, is skipped.
+    if is_binary_trace(file_path):
+        records = read_binary_trace(file_path)
+        return records['timestamp'].astype(np.float64), records[value_name].astype(np.int64)
+    with open(file_path, 'r') as f:
+        first_line = f.readline()
+    try:
+        float(first_line.split('\t')[0])
+        skip = 0
+    except ValueError:
+        skip = 1
+    if not first_line.strip():
+        return np.array([], dtype=np.float64), np.array([], dtype=np.int64)
+    df = pd.read_csv(file_path, sep='\t', header=None, skiprows=skip, usecols=[0, 1],
+                     names=['time', value_name], dtype={'time': np.float64, value_name: np.int64})
+    return df['time'].to_numpy(), df[value_name].to_numpy()
+
+
+def load_buffer_trace(file_path):
+    # (time, qlen) arrays of a -buf.tr queue length trace: text, binary or a
+    # step trace written by save_buffer_steps
+    if is_step_trace(file_path):
+        return load_buffer_steps(file_path)
+    return load_value_trace(file_path, 'qlen')
+
+
+def load_cwnd_trace(file_path):
+    # (time, cwnd in bytes) arrays of a -cwn.tr trace, text or binary
+    return load_value_trace(file_path, 'cwnd')
+
+
+def companion_trace(trace_file, kind):
+    # The -drp / -buf / -cwn trace written next to another trace of the same
+    # run, None if missing. The compact .npz form is preferred over the text one.
+    base = re.sub(r'-(drp|buf|cwn)\.(tr|npz)$', '', trace_file)
+    if base == trace_file:
+        base = os.path.splitext(trace_file)[0]
+    for path in (f"{base}-{kind}.npz", f"{base}-{kind}.tr"):
+        if os.path.exists(path):
+            return path
+    return None
+
+
+# Compact step-function form of the buffer traces (-buf.npz).
+# BufTracerfifo logs every enqueue and dequeue, so most records are 0->1->0
+# toggles at the same timestamp that the queue length (a step function of time)
+# never shows. collapse_steps keeps the last length of every timestamp and
+# drops updates that do not change the length, except the final record, which
+# marks where the trace ends (time-weighted statistics run up to it).
+# save_buffer_steps then stores the times as integer nanoseconds (ns-3's
+# resolution) delta-encoded, and the lengths delta-encoded, each in the
+# smallest integer dtype, in a compressed npz.
+
+STEP_FORMAT = 'buffer-steps'
+STEP_VERSION = 1
+STEP_TIME_UNIT = 1e-9  # seconds per tick
+ZIP_MAGIC = b'PK\x03\x04'
+
+
+def collapse_steps(times, qlens):
+    # Same step function with one update per timestamp and no repeated values,
+    # ending at the same time
+    times = np.asarray(times, dtype=np.float64)
+    qlens = np.asarray(qlens, dtype=np.int64)
+    if times.size == 0:
+        return times, qlens
+    if np.any(times[1:] < times[:-1]):
+        order = np.argsort(times, kind='stable')
+        times, qlens = times[order], qlens[order]
+    last = np.append(times[1:] != times[:-1], True)
+    times, qlens = times[last], qlens[last]
+    change = np.insert(qlens[1:] != qlens[:-1], 0, True)
+    change[-1] = True
+    return times[change], qlens[change]
+
+
+def smallest_int_dtype(values):
+    if values.size == 0:
+        return np.dtype(np.uint8)
+    return np.result_type(np.min_scalar_type(values.min()), np.min_scalar_type(values.max()))
+
+
+def save_buffer_steps(file_path, times, qlens):
+    # Write the collapsed step function of (times, qlens); returns its length
+    times, qlens = collapse_steps(times, qlens)
+    ticks = np.round(times / STEP_TIME_UNIT).astype(np.int64)
+    time_deltas = np.diff(ticks)
+    qlen_deltas = np.diff(qlens)
+    np.savez_compressed(
+        file_path,
+        format=np.array(STEP_FORMAT),
+        version=np.array(STEP_VERSION),
+        time_unit=np.array(STEP_TIME_UNIT),
+        first=np.array([ticks[0] if ticks.size else 0, qlens[0] if qlens.size else 0], dtype=np.int64),
+        count=np.array(ticks.size),
+        time_deltas=time_deltas.astype(smallest_int_dtype(time_deltas)),
+        qlen_deltas=qlen_deltas.astype(smallest_int_dtype(qlen_deltas)),
+    )
+    return ticks.size
+
+
+def is_step_trace(file_path):
+    with open(file_path, 'rb') as f:
+        return f.read(len(ZIP_MAGIC)) == ZIP_MAGIC
+
+
+def load_buffer_steps(file_path):
+    # (time, qlen) arrays of a step trace
+    with np.load(file_path) as steps:
+        if str(steps['format']) != STEP_FORMAT or int(steps['version']) != STEP_VERSION:
+            raise ValueError(f"{file_path} is not a version {STEP_VERSION} buffer step trace")
+        if int(steps['count']) == 0:
+            return np.array([], dtype=np.float64), np.array([], dtype=np.int64)
+        first_tick, first_qlen = steps['first']
+        ticks = np.cumsum(np.concatenate(([first_tick], steps['time_deltas'].astype(np.int64))))
+        qlens = np.cumsum(np.concatenate(([first_qlen], steps['qlen_deltas'].astype(np.int64))))
+        # Dividing by the whole ticks per second gives back the exact decimal
+        # times of the text trace (multiplying by 1e-9 is off in the last digit)
+        return ticks / round(1 / float(steps['time_unit'])), qlens
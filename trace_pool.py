@@ -0,0 +1,30 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Parallel map over independent trace files.
+# Every -drp.tr (or pcap) of a sweep can be processed on its own, so the
+# analyzers hand the per-file function and the file list to parallel_map, which
+# spreads them over a process pool in chunks and returns the results in input
+# order. func must be a module-level function (or functools.partial of one) so
+# it can be pickled to the workers.
+
+# Below this many items the pool start-up costs more than it saves
+MIN_PARALLEL_ITEMS = 8
+
+
+def default_jobs():
+    return os.cpu_count() or 1
+
+
+def parallel_map(func, items, jobs=None, chunksize=None):
+    items = list(items)
+    jobs = default_jobs() if jobs is None else jobs
+    jobs = min(jobs, len(items))
+    if jobs <= 1 or len(items) < MIN_PARALLEL_ITEMS:
+        return [func(item) for item in items]
+
+    if chunksize is None:
+        # A few chunks per worker keeps them busy when files differ in size
+        chunksize = max(1, len(items) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(func, items, chunksize=chunksize))
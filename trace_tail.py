@@ -0,0 +1,88 @@
+import io
+import os
+
+import numpy as np
+
+from trace_loader import BINARY_MAGIC, read_binary_header
+
+# Incremental reader for trace files that ns-3 is still writing (-drp.tr,
+# -buf.tr, -cwn.tr, text or binary). Every poll() reads only the bytes appended
+# since the previous call and returns the complete records among them; a
+# record cut in half by the writer is kept until the rest arrives. Memory use
+# does not grow with the trace, only the file offset and that partial record
+# are kept.
+
+class TraceFollower:
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.reset()
+
+    def reset(self):
+        self.offset = 0
+        self.partial = b''
+        self.started = False    # format known (binary header read / text)
+        self.dtype = None       # record dtype of a binary trace
+        self.n_columns = None
+
+    def poll(self):
+        # New complete records as a (n, columns) float64 array, None while the
+        # file does not exist yet
+        if not os.path.exists(self.file_path):
+            return None
+        if os.path.getsize(self.file_path) < self.offset:
+            # Truncated, e.g. the simulation was restarted with the same name
+            self.reset()
+        with open(self.file_path, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read()
+        self.offset += len(data)
+        buf = self.partial + data
+
+        if not self.started:
+            if len(buf) < len(BINARY_MAGIC) and BINARY_MAGIC.startswith(buf):
+                self.partial = buf
+                return self.empty()
+            if buf.startswith(BINARY_MAGIC):
+                try:
+                    self.dtype, header_len = read_binary_header(io.BytesIO(buf))
+                except ValueError:
+                    # Header not complete yet
+                    self.partial = buf
+                    return self.empty()
+                self.n_columns = len(self.dtype.names)
+                buf = buf[header_len:]
+            self.started = True
+
+        if self.dtype is not None:
+            return self._binary_records(buf)
+        return self._text_records(buf)
+
+    def empty(self):
+        return np.empty((0, self.n_columns or 0), dtype=np.float64)
+
+    def _binary_records(self, buf):
+        n_records = len(buf) // self.dtype.itemsize
+        end = n_records * self.dtype.itemsize
+        self.partial = buf[end:]
+        records = np.frombuffer(buf[:end], dtype=self.dtype)
+        return np.column_stack([records[name].astype(np.float64) for name in self.dtype.names]) \
+            if n_records else self.empty()
+
+    def _text_records(self, buf):
+        end = buf.rfind(b'\n') + 1
+        self.partial = buf[end:]
+        lines = buf[:end].decode().splitlines()
+        rows = []
+        for line in lines:
+            fields = line.split('\t')
+            try:
+                rows.append([float(v) for v in fields])
+            except ValueError:
+                continue  # header line
+        if not rows:
+            return self.empty()
+        if self.n_columns is None:
+            self.n_columns = len(rows[0])
+        # Ignore malformed lines with a different number of columns
+        rows = [row for row in rows if len(row) == self.n_columns]
+        return np.array(rows, dtype=np.float64).reshape(-1, self.n_columns)